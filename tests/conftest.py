@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the repository root importable for vhdl_testbench_generator
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
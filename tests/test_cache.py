@@ -0,0 +1,71 @@
+import os
+
+import vhdl_testbench_generator as tbgen
+
+def record(cache, source, *outputs):
+    entities = {'adder': tbgen._cache_record('key', str(outputs[0]),
+                                             str(outputs[1]) if len(outputs) > 1 else None)}
+    cache.update(str(source), tbgen.file_signature(str(source)), entities)
+
+def make_files(tmp_path):
+    source = tmp_path / 'adder.vhd'
+    source.write_text("entity adder is\nend entity;\n")
+    testbench = tmp_path / 'adder_tb.vhd'
+    testbench.write_text("-- testbench\n")
+    vectors = tmp_path / 'adder_tb.vec'
+    vectors.write_text("00\n")
+    return source, testbench, vectors
+
+def test_unknown_source_is_not_fresh(tmp_path):
+    source, _, _ = make_files(tmp_path)
+    assert not tbgen.BuildCache(None).is_fresh(str(source))
+
+def test_recorded_source_is_fresh_until_it_changes(tmp_path):
+    source, testbench, _ = make_files(tmp_path)
+    cache = tbgen.BuildCache(None)
+    record(cache, source, testbench)
+    assert cache.is_fresh(str(source))
+
+    source.write_text("entity adder is\n  port ( a : in bit );\nend entity;\n")
+    assert not cache.is_fresh(str(source))
+
+def test_touched_source_is_not_fresh(tmp_path):
+    source, testbench, _ = make_files(tmp_path)
+    cache = tbgen.BuildCache(None)
+    record(cache, source, testbench)
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not cache.is_fresh(str(source))
+
+def test_missing_outputs_are_not_fresh(tmp_path):
+    source, testbench, vectors = make_files(tmp_path)
+    cache = tbgen.BuildCache(None)
+    record(cache, source, testbench, vectors)
+    assert cache.is_fresh(str(source))
+
+    vectors.unlink()
+    assert not cache.is_fresh(str(source))
+    record(cache, source, testbench)
+    assert cache.is_fresh(str(source))
+
+    testbench.unlink()
+    assert not cache.is_fresh(str(source))
+
+def test_other_options_are_not_fresh(tmp_path):
+    source, testbench, _ = make_files(tmp_path)
+    path = str(tmp_path / 'cache.json')
+    cache = tbgen.BuildCache(path, options_key=tbgen.options_key({}))
+    record(cache, source, testbench)
+    cache.save()
+
+    assert tbgen.BuildCache(path, options_key=tbgen.options_key({})).is_fresh(str(source))
+    changed = tbgen.options_key({'timestamp': None})
+    assert changed != tbgen.options_key({})
+    assert not tbgen.BuildCache(path, options_key=changed).is_fresh(str(source))
+
+def test_missing_source_is_not_fresh(tmp_path):
+    source, testbench, _ = make_files(tmp_path)
+    cache = tbgen.BuildCache(None)
+    record(cache, source, testbench)
+    source.unlink()
+    assert not cache.is_fresh(str(source))
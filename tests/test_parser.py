@@ -0,0 +1,22 @@
+import vhdl_testbench_generator as tbgen
+
+ADJACENT_ENTITIES = """\
+entity a1 is
+  port ( x : in bit );
+end entity;
+entity a2 is
+  port ( y : out bit );
+end entity a2;
+entity a3 is
+end;
+"""
+
+def test_adjacent_entities_are_all_parsed():
+    names = [entity.name for entity in tbgen.iter_vhdl_entities(ADJACENT_ENTITIES)]
+    assert names == ['a1', 'a2', 'a3']
+
+def test_adjacent_entities_across_chunk_boundaries():
+    for size in (1, 7, 64):
+        chunks = [ADJACENT_ENTITIES[i:i + size] for i in range(0, len(ADJACENT_ENTITIES), size)]
+        names = [entity.name for entity in tbgen.iter_vhdl_entities(chunks)]
+        assert names == ['a1', 'a2', 'a3']
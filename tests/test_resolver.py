@@ -0,0 +1,54 @@
+import pytest
+
+import vhdl_testbench_generator as tbgen
+
+CONSTANTS = {'width': 8, 'depth': -3}
+
+def evaluate(text):
+    def lookup(parts):
+        if parts[-1] not in CONSTANTS:
+            raise tbgen._Unresolved(f"unknown {parts[-1]}")
+        return CONSTANTS[parts[-1]]
+
+    return tbgen._ExpressionEvaluator(list(tbgen._tokenize(text)), lookup).evaluate()
+
+@pytest.mark.parametrize('text, value', [
+    ('7 / 2', 3),
+    ('-7 / 2', -3),
+    ('7 / (-2)', -3),
+    ('(-7) / (-2)', 3),
+    ('width / 3', 2),
+    ('depth / 2', -1),
+])
+def test_division_truncates_towards_zero(text, value):
+    assert evaluate(text) == value
+
+@pytest.mark.parametrize('text, value', [
+    ('7 rem 3', 1),
+    ('(-7) rem 3', -1),
+    ('7 rem (-3)', 1),
+    ('(-7) rem (-3)', -1),
+    ('depth rem 2', -1),
+])
+def test_rem_takes_the_sign_of_the_left_operand(text, value):
+    assert evaluate(text) == value
+
+@pytest.mark.parametrize('text, value', [
+    ('7 mod 3', 1),
+    ('(-7) mod 3', 2),
+    ('7 mod (-3)', -2),
+    ('(-7) mod (-3)', -1),
+])
+def test_mod_takes_the_sign_of_the_right_operand(text, value):
+    assert evaluate(text) == value
+
+def test_operators_bind_like_vhdl():
+    assert evaluate('2 ** width / 4 - 1') == 63
+    assert evaluate('-width / 3') == -2
+    assert evaluate('abs depth rem 2') == 1
+    assert evaluate('16#FF# / maximum(width, 2)') == 31
+
+@pytest.mark.parametrize('text', ['1 / 0', '1 rem (width - 8)', '1 mod 0'])
+def test_division_by_zero_is_unresolved(text):
+    with pytest.raises(tbgen._Unresolved):
+        evaluate(text)
@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+
+import pytest
+
+import vhdl_testbench_generator as tbgen
+
+# Stands in for GHDL: analysis appends the file name to analyzed.txt in the
+# work directory, and what a run prints depends on the testbench unit name.
+FAKE_SIMULATOR = """\
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+workdir = next(arg.split('=', 1)[1] for arg in args if arg.startswith('--workdir='))
+if args[0] == '-a':
+    with open(os.path.join(workdir, 'analyzed.txt'), 'a') as log:
+        log.write(os.path.basename(args[-1]) + '\\n')
+    sys.exit(0)
+
+unit = next(arg for arg in args[1:] if not arg.startswith('-'))
+if unit.startswith('slow'):
+    time.sleep(60)
+elif unit.startswith('bad'):
+    print(unit + '.vhd:12:5:@40ns:(report failure): sum mismatch')
+elif unit.startswith('odd'):
+    print('MISMATCH at vector 3')
+elif unit.startswith('crash'):
+    sys.exit(1)
+print('simulation finished')
+"""
+
+def write_design(directory, name, comment=''):
+    """Write an entity and a testbench that instantiates it from work."""
+    (directory / f"{name}.vhd").write_text(
+        f"{comment}entity {name} is\n  port ( a : in bit );\nend entity;\n")
+    (directory / f"{name}_tb.vhd").write_text(
+        f"entity {name}_tb is\nend entity;\n"
+        f"architecture sim of {name}_tb is\nbegin\n"
+        f"  dut: entity work.{name} port map ( a => '0' );\nend architecture;\n")
+
+class Project:
+    def __init__(self, root):
+        self.root = root
+        self.src = root / 'src'
+        self.src.mkdir()
+        self.workdir = root / 'work'
+        self.results_path = root / 'results.json'
+        fake = root / 'fake_sim.py'
+        fake.write_text(FAKE_SIMULATOR)
+        self.simulator = f'"{sys.executable}" "{fake}"'
+
+    def run(self, *args):
+        """Call the run subcommand; return (exit status, {unit: status})."""
+        with pytest.raises(SystemExit) as exit_info:
+            tbgen.run_main([str(self.src), '--simulator', self.simulator,
+                            '--workdir', str(self.workdir),
+                            '--json', str(self.results_path), *args])
+        with open(self.results_path) as file:
+            results = json.load(file)
+        return exit_info.value.code, {r['unit']: r['status'] for r in results}
+
+    def analyzed(self):
+        path = self.workdir / 'analyzed.txt'
+        return path.read_text().split() if path.exists() else []
+
+@pytest.fixture
+def project(tmp_path):
+    return Project(tmp_path)
+
+def test_files_are_analyzed_again_only_when_their_hash_changes(project):
+    write_design(project.src, 'adder')
+    write_design(project.src, 'other')
+    assert project.run()[0] == 0
+    assert project.analyzed() == ['adder.vhd', 'other.vhd', 'adder_tb.vhd', 'other_tb.vhd']
+
+    assert project.run()[0] == 0
+    assert len(project.analyzed()) == 4
+
+    # A newer mtime with the same content is not a change
+    source = project.src / 'adder.vhd'
+    os.utime(source, (source.stat().st_atime + 10, source.stat().st_mtime + 10))
+    assert project.run()[0] == 0
+    assert len(project.analyzed()) == 4
+
+    # Changed content is analyzed again, and so is the testbench using it
+    write_design(project.src, 'adder', comment='-- carry chain\n')
+    assert project.run()[0] == 0
+    assert project.analyzed()[4:] == ['adder.vhd', 'adder_tb.vhd']
+
+def test_default_fail_pattern(project):
+    for name in ('good', 'bad', 'odd', 'crash'):
+        write_design(project.src, name)
+    code, statuses = project.run()
+    assert code == 1
+    assert statuses == {'good_tb': 'pass', 'bad_tb': 'fail', 'odd_tb': 'pass',
+                        'crash_tb': 'fail'}
+
+def test_custom_fail_pattern(project):
+    for name in ('good', 'bad', 'odd'):
+        write_design(project.src, name)
+    code, statuses = project.run('--fail-pattern', 'mismatch at vector')
+    assert code == 1
+    assert statuses == {'good_tb': 'pass', 'bad_tb': 'pass', 'odd_tb': 'fail'}
+
+def test_empty_fail_pattern_trusts_the_exit_status(project):
+    for name in ('good', 'bad', 'odd'):
+        write_design(project.src, name)
+    code, statuses = project.run('--fail-pattern', '')
+    assert code == 0
+    assert set(statuses.values()) == {'pass'}
+
+def test_timeout(project):
+    write_design(project.src, 'slow')
+    write_design(project.src, 'good')
+    code, statuses = project.run('--timeout', '1')
+    assert code == 1
+    assert statuses == {'slow_tb': 'timeout', 'good_tb': 'pass'}
+    with open(project.results_path) as file:
+        slow = next(r for r in json.load(file) if r['unit'] == 'slow_tb')
+    assert slow['wall_s'] < 30
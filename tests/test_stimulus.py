@@ -0,0 +1,82 @@
+import pytest
+
+import vhdl_testbench_generator as tbgen
+
+numpy = pytest.importorskip('numpy')
+
+def column(name, type_mark, width, direction='in'):
+    port = tbgen.Port(name, direction, f"{type_mark}({width - 1} downto 0)")
+    return tbgen.StimulusColumn(port, type_mark, width, 0, (1 << width) - 1)
+
+def limbs(*values):
+    return numpy.array(values, dtype=numpy.uint64)
+
+def test_format_vectors_hex():
+    columns = [column('a', 'unsigned', 5), column('b', 'unsigned', 70)]
+    data = [[limbs(0x1f, 0x03)],
+            [limbs(0xffffffffffffffff, 0x1), limbs(0x3f, 0x0)]]
+    assert tbgen._format_vectors(columns, data, 2, 'hex') == (
+        b"1f 3fffffffffffffffff\n"
+        b"03 000000000000000001\n")
+
+def test_format_vectors_bin():
+    columns = [column('a', 'unsigned', 3), tbgen.StimulusColumn(None, 'flag', 1, 0, 1)]
+    data = [[limbs(5, 2, 0)], [limbs(1, 0, 1)]]
+    assert tbgen._format_vectors(columns, data, 3, 'bin') == b"101 1\n010 0\n000 1\n"
+
+def test_format_vectors_high_limb_starts_at_bit_64():
+    columns = [column('wide', 'std_logic_vector', 68)]
+    data = [[limbs(0), limbs(0b1010)]]
+    assert tbgen._format_vectors(columns, data, 1, 'bin') == b"1010" + b"0" * 64 + b"\n"
+
+def checker(function, latency, inputs=None):
+    inputs = inputs or [column('a', 'unsigned', 4)]
+    outputs = [column('y', 'unsigned', 4, 'out')]
+    entity = tbgen.Entity('inc', (), tuple(c.port for c in inputs + outputs))
+    model = tbgen.GoldenModel(function, None, latency)
+    return tbgen._GoldenChecker(entity, model, inputs, outputs)
+
+def expected(check, *values):
+    flags, outputs = check.expected([[limbs(*values)]], len(values))
+    return flags[0].tolist(), outputs[0][0].tolist()
+
+def increment(inputs):
+    return {'Y': inputs['a'] + 1}
+
+def test_golden_checker_without_latency():
+    check = checker(increment, 0)
+    assert expected(check, 1, 2, 15) == ([1, 1, 1], [2, 3, 0])
+
+def test_golden_checker_latency_carries_across_batches():
+    check = checker(increment, 2)
+    assert expected(check, 1, 2, 3) == ([0, 0, 1], [0, 0, 2])
+    assert expected(check, 4, 5) == ([1, 1], [3, 4])
+
+def test_golden_checker_latency_longer_than_a_batch():
+    check = checker(increment, 3)
+    assert expected(check, 1, 2) == ([0, 0], [0, 0])
+    assert expected(check, 3, 4) == ([0, 1], [0, 2])
+    assert expected(check, 5) == ([1], [3])
+
+def test_golden_checker_signed_inputs_and_negative_results():
+    seen = []
+
+    def negate(inputs):
+        seen.extend(inputs['b'].tolist())
+        return {'y': -inputs['b']}
+
+    check = checker(negate, 0, [column('b', 'signed', 4)])
+    assert expected(check, 0xf, 0x8, 0x1) == ([1, 1, 1], [1, 8, 0xf])
+    assert seen == [-1, -8, 1]
+
+def test_golden_checker_scalar_result_is_broadcast():
+    check = checker(lambda inputs: {'y': 7}, 1)
+    assert expected(check, 1, 2, 3) == ([0, 1, 1], [0, 7, 7])
+
+def test_golden_checker_errors():
+    with pytest.raises(ValueError, match="at most 64 bits"):
+        checker(increment, 0, [column('a', 'unsigned', 65)])
+    with pytest.raises(ValueError, match="no value for 'y'"):
+        expected(checker(lambda inputs: {'z': 0}, 0), 1)
+    with pytest.raises(ValueError, match="must return a dict"):
+        expected(checker(lambda inputs: 0, 0), 1)
@@ -0,0 +1,264 @@
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from collections import namedtuple
+
+import vhdl_testbench_generator as tbgen
+
+class Scenario(namedtuple('Scenario', 'name files ports generics comment_density '
+                                      'body_lines entities_per_file')):
+    """Shape of one synthetic VHDL corpus."""
+    __slots__ = ()
+
+# Built-in scenarios, each stressing one dimension of the input
+SCENARIOS = (
+    Scenario('typical', files=200, ports=16, generics=2, comment_density=0.2,
+             body_lines=100, entities_per_file=1),
+    Scenario('wide_ports', files=4, ports=5000, generics=4, comment_density=0.1,
+             body_lines=10, entities_per_file=1),
+    Scenario('large_body', files=4, ports=8, generics=1, comment_density=0.3,
+             body_lines=10000, entities_per_file=1),
+    Scenario('huge_body', files=1, ports=8, generics=1, comment_density=0.3,
+             body_lines=200000, entities_per_file=1),
+    Scenario('comment_heavy', files=100, ports=32, generics=4, comment_density=2.0,
+             body_lines=200, entities_per_file=1),
+    Scenario('many_entities', files=10, ports=12, generics=2, comment_density=0.2,
+             body_lines=20, entities_per_file=50),
+)
+
+# Metrics where a higher value is better; everything else must not grow
+THROUGHPUT_METRICS = ('parse_files_per_s', 'parse_mb_per_s', 'generate_files_per_s',
+                      'generate_mb_per_s', 'write_files_per_s', 'write_mb_per_s')
+MEMORY_METRICS = ('parse_peak_kb', 'generate_peak_kb')
+
+def synthesize_entity(name, scenario, rng):
+    """Return the VHDL text of one entity with its architecture body."""
+    lines = []
+
+    def comment(text):
+        # comment_density is the expected number of comment lines per code line
+        count = int(scenario.comment_density)
+        if rng.random() < scenario.comment_density - count:
+            count += 1
+        for _ in range(count):
+            lines.append(f"    -- {text}: port ( x : in bit ); end entity;")
+
+    lines.append(f"entity {name} is")
+    if scenario.generics:
+        lines.append("  generic (")
+        items = [f"    G{i} : integer := {rng.randint(1, 64)}" for i in range(scenario.generics)]
+        lines.append(";\n".join(items))
+        lines.append("  );")
+    lines.append("  port (")
+    items = []
+    for i in range(scenario.ports):
+        if i == 0:
+            items.append("    clk : in std_logic")
+        elif rng.random() < 0.5:
+            items.append(f"    p{i} : {rng.choice(('in', 'out'))} std_logic")
+        else:
+            width = rng.randint(2, 64)
+            items.append(f"    p{i} : {rng.choice(('in', 'out'))} "
+                         f"std_logic_vector({width - 1} downto 0)")
+    lines.append(";\n".join(items))
+    lines.append("  );")
+    lines.append(f"end entity {name};")
+    lines.append("")
+    lines.append(f"architecture rtl of {name} is")
+    lines.append("  signal tmp : std_logic_vector(7 downto 0);")
+    lines.append("begin")
+    for i in range(scenario.body_lines):
+        comment(f"statement {i}")
+        lines.append(f"  tmp({i % 8}) <= not tmp({(i + 1) % 8}) when clk = '1' else '0';")
+    lines.append("end architecture rtl;")
+    lines.append("")
+    return "\n".join(lines)
+
+def synthesize_corpus(directory, scenario, seed=0):
+    """Write the corpus of a scenario into directory and return the file paths."""
+    rng = random.Random(seed)
+    paths = []
+    for f in range(scenario.files):
+        path = os.path.join(directory, f"{scenario.name}_{f}.vhd")
+        with open(path, 'w') as file:
+            file.write("library ieee;\nuse ieee.std_logic_1164.all;\n\n")
+            for e in range(scenario.entities_per_file):
+                file.write(synthesize_entity(f"{scenario.name}_{f}_{e}", scenario, rng))
+        paths.append(path)
+    return paths
+
+def _best_time(function, repeat):
+    """Return the fastest of repeat runs of function, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _peak_kb(function):
+    """Return the peak traced memory of one run of function, in KiB."""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def run_scenario(scenario, repeat=3, seed=0):
+    """Benchmark parse, generate and write for one scenario.
+
+    Parsing is measured on sources already in memory and generation on
+    entities already parsed, so each phase is timed on its own. Peak memory
+    is measured in a separate untimed run because tracing slows Python down.
+    """
+    generator = tbgen.VHDLTestbenchGenerator(timestamp=None)
+    with tempfile.TemporaryDirectory(prefix='tbbench-') as directory:
+        paths = synthesize_corpus(directory, scenario, seed)
+        sources = []
+        for path in paths:
+            with open(path, 'r') as file:
+                sources.append(file.read())
+        source_bytes = sum(len(s.encode('utf-8')) for s in sources)
+
+        def parse():
+            return [list(tbgen.iter_vhdl_entities(source)) for source in sources]
+
+        entities = [entity for per_file in parse() for entity in per_file]
+
+        def generate():
+            return [generator.generate_testbench(entity) for entity in entities]
+
+        testbenches = generate()
+        output_bytes = sum(len(t.encode('utf-8')) for t in testbenches)
+        out_dir = os.path.join(directory, 'out')
+        os.makedirs(out_dir)
+
+        def write():
+            # Alternate content so every run really replaces the files
+            write.flip = not getattr(write, 'flip', False)
+            suffix = "\n" if write.flip else ""
+            for entity, text in zip(entities, testbenches):
+                path = os.path.join(out_dir, f"{entity.name}_tb.vhd")
+                tbgen.write_if_changed(path, text + suffix)
+
+        parse_time = _best_time(parse, repeat)
+        generate_time = _best_time(generate, repeat)
+        write_time = _best_time(write, repeat)
+        parse_peak = _peak_kb(parse)
+        generate_peak = _peak_kb(lambda: [generator.emit_testbench(e, io.StringIO())
+                                          for e in entities])
+
+    mb = 1024 * 1024
+    return {
+        'files': len(paths),
+        'entities': len(entities),
+        'source_mb': round(source_bytes / mb, 3),
+        'parse_s': parse_time,
+        'parse_files_per_s': len(paths) / parse_time,
+        'parse_mb_per_s': source_bytes / mb / parse_time,
+        'parse_peak_kb': parse_peak,
+        'generate_s': generate_time,
+        'generate_files_per_s': len(entities) / generate_time,
+        'generate_mb_per_s': output_bytes / mb / generate_time,
+        'generate_peak_kb': generate_peak,
+        'write_s': write_time,
+        'write_files_per_s': len(entities) / write_time,
+        'write_mb_per_s': output_bytes / mb / write_time,
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages relative to a baseline."""
+    regressions = []
+    for name, metrics in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in THROUGHPUT_METRICS:
+            if metric in reference and metrics[metric] < reference[metric] * (1 - tolerance):
+                regressions.append(f"{name}.{metric}: {metrics[metric]:.1f} "
+                                   f"< baseline {reference[metric]:.1f}")
+        for metric in MEMORY_METRICS:
+            if metric in reference and metrics[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name}.{metric}: {metrics[metric]:.1f} "
+                                   f"> baseline {reference[metric]:.1f}")
+    return regressions
+
+def print_report(name, metrics):
+    """Print a one-block human-readable report for a scenario."""
+    print(f"{name}: {metrics['files']} files, {metrics['entities']} entities, "
+          f"{metrics['source_mb']} MB")
+    for phase in ('parse', 'generate', 'write'):
+        line = (f"  {phase:<8} {metrics[phase + '_s'] * 1000:9.1f} ms "
+                f"{metrics[phase + '_files_per_s']:10.1f} files/s "
+                f"{metrics[phase + '_mb_per_s']:8.2f} MB/s")
+        if phase + '_peak_kb' in metrics:
+            line += f"  peak {metrics[phase + '_peak_kb']:.0f} KiB"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark VHDL parsing and testbench generation on synthetic corpora."
+    )
+    parser.add_argument('--scenario', action='append', default=None,
+                        choices=[s.name for s in SCENARIOS] + ['custom'],
+                        help="scenario to run (repeatable, default: all built-in)")
+    parser.add_argument('--files', type=int, default=50, help="custom scenario: number of files")
+    parser.add_argument('--ports', type=int, default=16, help="custom scenario: ports per entity")
+    parser.add_argument('--generics', type=int, default=2, help="custom scenario: generics per entity")
+    parser.add_argument('--comment-density', type=float, default=0.2,
+                        help="custom scenario: comment lines per code line")
+    parser.add_argument('--body-lines', type=int, default=100,
+                        help="custom scenario: architecture body statements")
+    parser.add_argument('--entities-per-file', type=int, default=1,
+                        help="custom scenario: entities per file")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per phase, best is kept")
+    parser.add_argument('--seed', type=int, default=0, help="corpus random seed")
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--save-baseline', metavar='FILE', help="store the results as a baseline")
+    parser.add_argument('--baseline', metavar='FILE', help="fail if results regress against FILE")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="allowed relative regression against the baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    scenarios = []
+    for name in args.scenario or [s.name for s in SCENARIOS]:
+        if name == 'custom':
+            scenarios.append(Scenario('custom', args.files, args.ports, args.generics,
+                                      args.comment_density, args.body_lines,
+                                      args.entities_per_file))
+        else:
+            scenarios.append(next(s for s in SCENARIOS if s.name == name))
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, args.repeat, args.seed)
+        print_report(scenario.name, results[scenario.name])
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print()
+            print("PERFORMANCE REGRESSIONS:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print()
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+if __name__ == "__main__":
+    main()
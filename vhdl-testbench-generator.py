@@ -1,138 +1,1740 @@
 import re
-from datetime import datetime
+import io
+from datetime import datetime, timezone
 import os
 import sys
+import glob
+import argparse
+import json
+import time
+import hashlib
+import itertools
+import inspect
+import sqlite3
+import select
+import struct
+import ctypes
+import ctypes.util
+import tempfile
+import zlib
+import shlex
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+try:
+    import numpy
+except ImportError:
+    # Only needed for stimulus vector generation
+    numpy = None
+
+# Source file extensions picked up when scanning directories
+VHDL_EXTENSIONS = ('.vhd', '.vhdl')
+
+# Bump whenever the generated testbench layout changes so cached
+# interface hashes from older versions are invalidated
+TEMPLATE_VERSION = 3
+
+# Simulated time after which a testbench that has not finished fails
+DEFAULT_WATCHDOG = '1 ms'
+
+# Record signal bundling the ports of each mode when ports are bundled;
+# linkage ports keep a signal of their own
+_BUNDLE_SIGNALS = {'in': 'dut_in', 'out': 'dut_out', 'buffer': 'dut_out', 'inout': 'dut_inout'}
+
+# VHDL time literal accepted for the watchdog
+_TIME_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(fs|ps|ns|us|ms|sec|min|hr)$', re.IGNORECASE)
+
+# Block size used when reading sources incrementally
+CHUNK_SIZE = 64 * 1024
+
+# Format of the "Generated on" header line
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Default size limit of the incremental build cache, in source files
+DEFAULT_CACHE_ENTRIES = 20000
+
+# Build cache file used by --watch when --cache is not given
+DEFAULT_WATCH_CACHE = '.tbgen-cache.json'
+
+class Generic(namedtuple('Generic', 'name type default')):
+    """One generic of an entity; default is None when none is declared."""
+    __slots__ = ()
+
+class Port(namedtuple('Port', 'name direction type')):
+    """One port of an entity, with its mode and subtype indication."""
+    __slots__ = ()
+
+class Entity(namedtuple('Entity', 'name generics ports')):
+    """An entity interface: its name and tuples of Generic and Port.
+
+    Entities are immutable tuples without per-instance dictionaries, so
+    they are cheap to keep around, hashable and safe to share between
+    threads and worker processes.
+    """
+    __slots__ = ()
+
+    def clock_port(self):
+        """Return the first port that looks like a clock, or None."""
+        for port in self.ports:
+            if port.name.lower().startswith(('clk', 'clock')):
+                return port
+        return None
+
+class Constant(namedtuple('Constant', 'name type value')):
+    """One package constant; value is None for a deferred constant."""
+    __slots__ = ()
+
+class Package(namedtuple('Package', 'name constants')):
+    """A package declaration: its name and a tuple of Constant."""
+    __slots__ = ()
+
+# Single master pattern for the entity header lexer. Whitespace and comments
+# are matched so they can be skipped; every alternative is anchored at the
+# current position, so a scan never backtracks over earlier input.
+_TOKEN_RE = re.compile(
+    r'(?P<skip>\s+|--[^\n]*|/\*.*?\*/)'
+    r'|(?P<bitstring>[bBoOxX]"[0-9a-fA-F_]*")'
+    r'|(?P<ident>[a-zA-Z]\w*|\\[^\\\n]*\\)'
+    r'|(?P<number>\d[\d_]*(?:\.[\d_]+)?(?:#[0-9a-fA-F_.]+#)?(?:[eE][+-]?\d+)?)'
+    r'|(?P<string>"(?:[^"\n]|"")*")'
+    r"|(?P<char>'.')"
+    r'|(?P<op>:=|=>|<=|>=|/=|\*\*|<>|.)',
+    re.DOTALL
+)
+
+# Patterns used to skip ahead to the next design unit header between units,
+# so text that cannot hold an interface is searched but never tokenized.
+# Comments may separate the words of a header; _comment_end() then rejects
+# matches that lie inside a comment or string.
+_SEEK_GAP = r'(?:\s|--[^\n]*\n)+'
+_ENTITY_SEEK_RE = re.compile(
+    r'entity' + _SEEK_GAP + r'(?:\w+|\\[^\\\n]*\\)' + _SEEK_GAP + r'is\b', re.IGNORECASE)
+_UNIT_SEEK_RE = re.compile(
+    r'(?:entity|package)' + _SEEK_GAP + r'(?:\w+|\\[^\\\n]*\\)' + _SEEK_GAP + r'is\b',
+    re.IGNORECASE)
+
+# Lines kept back at a chunk boundary while skipping ahead, so a header
+# broken over lines is still found once the rest of it has been read
+_SEEK_HOLD_LINES = 3
+
+# Comments and strings, the last alternative being a block comment not closed
+# in the text searched
+_SKIP_RE = re.compile(r'--[^\n]*|/\*.*?\*/|"(?:[^"\n]|"")*"|\'"\'|/\*', re.DOTALL)
+
+# Port modes recognised in an interface element
+_PORT_MODES = ('in', 'out', 'inout', 'buffer', 'linkage')
+
+# Interface declarations that carry no value (VHDL-2008 generic types etc.)
+_NON_VALUE_GENERICS = ('type', 'package', 'function', 'procedure', 'pure', 'impure')
+
+# Words after 'end' that close a nested declaration inside a package
+_NESTED_ENDS = ('record', 'component', 'protected', 'units', 'function', 'procedure')
+
+def _comment_end(text, start, index, endpos):
+    """Return where the comment or string enclosing text[index] ends.
+
+    start must lie outside comments and strings. Returns None when index
+    is in code, and -1 when it is in a block comment not closed before
+    endpos.
+    """
+    if text.find('/*', start, index) < 0:
+        # Only block comments span lines, so the line of index decides
+        start = max(start, text.rfind('\n', start, index) + 1)
+    search = _SKIP_RE.search
+    while True:
+        m = search(text, start, endpos)
+        if m is None or m.start() >= index:
+            return None
+        if m.group() == '/*':
+            return -1
+        if m.end() > index:
+            return m.end()
+        start = m.end()
+
+def _tokenize(source, seek=None):
+    """Yield (kind, text) tokens from VHDL source, skipping comments.
+
+    source is either a string or an iterable of string chunks, such as a
+    file read block by block. Chunks are pulled only when the lexer runs
+    out of complete lines, so a consumer that stops early never reads the
+    rest of the input.
+
+    With a seek pattern (such as _ENTITY_SEEK_RE) the lexer first skips to
+    the next match outside comments and strings instead of tokenizing.
+    Sending a pattern into the generator skips ahead the same way from the
+    current position and returns the token found there, so text between
+    design units is only searched by the regex engine, never tokenized.
+    """
+    chunks = iter((source,)) if isinstance(source, str) else iter(source)
+    buffer = ''
+    pos = 0
+    # Tokens starting before this index cannot be extended by more input;
+    # apart from block comments no token spans a line break.
+    safe = 0
+    more = True
+    prev = None
+    match = _TOKEN_RE.match
+    while True:
+        if more and pos >= safe:
+            chunk = next(chunks, None)
+            if chunk is None:
+                more = False
+            elif chunk:
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            safe = buffer.rfind('\n') + 1 if more else len(buffer)
+            continue
+        if pos >= len(buffer):
+            return
+
+        if seek is not None:
+            m = seek.search(buffer, pos, safe)
+            if m is not None:
+                index = m.start()
+            elif more:
+                # Hold back the last lines, a header may continue in input
+                # that has not been read yet
+                index = safe
+                for _ in range(_SEEK_HOLD_LINES):
+                    if index <= pos:
+                        break
+                    index = max(pos, buffer.rfind('\n', pos, index - 1) + 1)
+            else:
+                return
+            end = _comment_end(buffer, pos, index, safe)
+            if end == -1:
+                # Inside a block comment whose end has not been read yet
+                if not more:
+                    return
+                safe = pos
+            elif end is not None:
+                pos = end
+            elif m is None:
+                pos = safe = index
+            elif index > 0 and (buffer[index - 1].isalnum() or buffer[index - 1] in '_\\'):
+                pos = m.end()
+            else:
+                pos = index
+                seek = None
+            continue
+
+        m = match(buffer, pos)
+        kind = m.lastgroup
+        value = m.group()
+        if more and value == '/' and buffer.startswith('*', pos + 1):
+            # Block comment whose end has not been read yet
+            safe = pos
+            continue
+        if kind == 'skip':
+            pos = m.end()
+            continue
+        # A tick after a name or closing paren is an attribute, not a literal
+        if kind == 'char' and prev is not None and (prev[0] == 'ident' or prev[1] == ')'):
+            kind, value = 'op', "'"
+        pos += len(value)
+        prev = (kind, value)
+        seek = yield prev
+        if seek is not None:
+            prev = None
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield the text of a file in chunks of chunk_size characters.
+
+    The file is closed when the generator is exhausted or closed, so a
+    parser that only needs the entity header reads little more than that.
+    """
+    with open(path, 'r') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _join_tokens(tokens):
+    """Render a token sequence back into compact VHDL text."""
+    words = ('ident', 'number', 'string', 'char', 'bitstring')
+    parts = []
+    prev = None
+    for kind, value in tokens:
+        if prev is not None:
+            if prev[0] in words and kind in words:
+                parts.append(' ')
+            elif value in ('=>', ':=', '&') or prev[1] in (',', '=>', ':=', '&'):
+                parts.append(' ')
+        parts.append(value)
+        prev = (kind, value)
+    return ''.join(parts)
+
+def _read_interface_list(tokens):
+    """Consume a parenthesised interface list and split it at top-level ';'.
+
+    The opening parenthesis must be the next token. Nested parentheses in
+    ranges and aggregates are tracked so only the matching ')' ends the list.
+    """
+    first = next(tokens, None)
+    if first is None or first[1] != '(':
+        return []
+    elements = [[]]
+    depth = 1
+    for token in tokens:
+        value = token[1]
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+            if depth == 0:
+                break
+        elif value == ';' and depth == 1:
+            elements.append([])
+            continue
+        elements[-1].append(token)
+    return [element for element in elements if element]
+
+def _split_top_level(tokens, separator):
+    """Split tokens at the first separator outside parentheses."""
+    depth = 0
+    for index, (_, value) in enumerate(tokens):
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif value == separator and depth == 0:
+            return tokens[:index], tokens[index + 1:]
+    return tokens, None
+
+def _parse_interface_element(element, is_port):
+    """Turn one interface element into a list of Port or Generic records."""
+    if element[0][1].lower() in _NON_VALUE_GENERICS:
+        return []
+    if element[0][1].lower() in ('signal', 'constant', 'variable', 'file'):
+        element = element[1:]
+
+    names, rest = _split_top_level(element, ':')
+    if not rest:
+        return []
+    names = [value for kind, value in names if kind == 'ident']
+
+    direction = 'in'
+    if is_port and rest[0][1].lower() in _PORT_MODES:
+        direction = rest[0][1].lower()
+        rest = rest[1:]
+
+    subtype, default = _split_top_level(rest, ':=')
+    if subtype and subtype[-1][1].lower() == 'bus':
+        subtype = subtype[:-1]
+    type_text = _join_tokens(subtype)
+
+    if is_port:
+        return [Port(name, direction, type_text) for name in names]
+    default_text = _join_tokens(default) if default else None
+    return [Generic(name, type_text, default_text) for name in names]
+
+def iter_vhdl_entities(vhdl_content, max_entities=None):
+    """Yield an Entity for every entity in the source, in order.
+
+    vhdl_content is a string or an iterable of chunks (see read_chunks).
+    All entities share one token stream, so the source is scanned once and
+    each entity is available as soon as its header has been parsed. With
+    max_entities set, scanning stops right after that many entity headers
+    and the remaining input is never read.
+    """
+    tokens = _tokenize(vhdl_content, seek=_ENTITY_SEEK_RE)
+    count = 0
+    while max_entities is None or count < max_entities:
+        entity = parse_entity_header(tokens)
+        if entity is None:
+            break
+        count += 1
+        yield entity
+    tokens.close()
+
+def iter_design_units(vhdl_content):
+    """Yield an Entity or Package for every entity and package declaration, in order."""
+    tokens = _tokenize(vhdl_content, seek=_UNIT_SEEK_RE)
+    while True:
+        unit = parse_design_unit(tokens)
+        if unit is None:
+            break
+        yield unit
+    tokens.close()
+
+def parse_entity_header(tokens):
+    """Consume tokens up to and including the next entity header.
+
+    Returns an Entity, or None when the token stream ends without another
+    entity declaration. Parsing stops at the 'end' of
+    the entity, so architecture bodies that follow are never tokenized.
+    """
+    return parse_design_unit(tokens, packages=False)
+
+def parse_design_unit(tokens, packages=True):
+    """Consume tokens up to and including the next entity or package declaration.
+
+    Returns an Entity or a Package, or None at the end of the stream. With
+    packages False only entities are returned. Package bodies are skipped.
+    On a stream from _tokenize the text up to each candidate keyword is
+    skipped with a regex search, so architecture bodies are not tokenized.
+    """
+    seek = _UNIT_SEEK_RE if packages else _ENTITY_SEEK_RE
+    prev = None
+    token = _seek(tokens, seek)
+    while token is not None:
+        kind, value = token
+        word = value.lower()
+        if (kind == 'ident' and (word == 'entity' or (packages and word == 'package'))
+                and (prev is None or prev.lower() != 'end')):
+            name = next(tokens, None)
+            if name is not None and name[0] == 'ident':
+                keyword = next(tokens, None)
+                if keyword is not None and keyword[1].lower() == 'is':
+                    if word == 'entity':
+                        return _parse_entity_body(name[1], tokens)
+                    return _parse_package_body(name[1], tokens)
+            # An instantiation, "end entity" or "package body"
+            prev = None
+            token = _seek(tokens, seek)
+            continue
+        prev = value
+        token = next(tokens, None)
+    return None
+
+def _seek(tokens, pattern):
+    """Skip tokens ahead to the next match of pattern and return its first token.
+
+    A fresh stream seeks on its first step when it was created with a seek
+    pattern. Streams that cannot seek just return their next token.
+    """
+    try:
+        if inspect.getgeneratorstate(tokens) == inspect.GEN_CREATED:
+            return next(tokens)
+        return tokens.send(pattern)
+    except StopIteration:
+        return None
+
+def _skip_statement(tokens):
+    """Consume tokens up to and including the next ';'."""
+    for kind, value in tokens:
+        if value == ';':
+            break
+
+def _parse_entity_body(name, tokens):
+    """Parse generic and port clauses until the end of the entity."""
+    generics = []
+    ports = []
+    depth = 0
+    for kind, value in tokens:
+        word = value.lower()
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif depth == 0 and kind == 'ident':
+            if word == 'generic' and not generics:
+                for element in _read_interface_list(tokens):
+                    generics.extend(_parse_interface_element(element, is_port=False))
+            elif word == 'port' and not ports:
+                for element in _read_interface_list(tokens):
+                    ports.extend(_parse_interface_element(element, is_port=True))
+            elif word == 'end':
+                # Consume "end [entity] [name];" so the next header search
+                # does not mistake its 'entity' for a new declaration
+                _skip_statement(tokens)
+                break
+    return Entity(name, tuple(generics), tuple(ports))
+
+def _parse_package_body(name, tokens):
+    """Parse the constant declarations of a package until its end.
+
+    Nested declarations that have their own 'end' (records, components,
+    protected types) are stepped over. A package instantiation
+    ("package p is new ...") yields a Package without constants.
+    """
+    constants = []
+    first = next(tokens, None)
+    if first is None:
+        return Package(name, ())
+    if first[1].lower() == 'new':
+        _skip_statement(tokens)
+        return Package(name, ())
+
+    depth = 0
+    for kind, value in itertools.chain([first], tokens):
+        word = value.lower()
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif depth == 0 and kind == 'ident':
+            if word == 'constant':
+                constants.extend(_parse_constant(tokens))
+            elif word == 'end':
+                following = next(tokens, None)
+                if following is None:
+                    break
+                if following[1].lower() in _NESTED_ENDS:
+                    _skip_statement(tokens)
+                    continue
+                if following[1] != ';':
+                    _skip_statement(tokens)
+                break
+    return Package(name, tuple(constants))
+
+def _parse_constant(tokens):
+    """Parse the rest of a constant declaration into Constant records."""
+    declaration = []
+    depth = 0
+    for token in tokens:
+        value = token[1]
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif value == ';' and depth == 0:
+            break
+        declaration.append(token)
+
+    names, rest = _split_top_level(declaration, ':')
+    if not rest:
+        return []
+    subtype, value = _split_top_level(rest, ':=')
+    type_text = _join_tokens(subtype)
+    value_text = _join_tokens(value) if value else None
+    return [Constant(n, type_text, value_text) for kind, n in names if kind == 'ident']
+
+class _Unresolved(Exception):
+    """Raised when an expression cannot be reduced to an integer."""
+
+# Based literal such as 16#FF#
+_BASED_LITERAL_RE = re.compile(r'(\d+)#([0-9a-fA-F]+)#$')
+
+# Functions understood by the expression evaluator
+_RESOLVER_FUNCTIONS = {'minimum': min, 'maximum': max}
+
+# Quick test for files worth parsing for package declarations
+_PACKAGE_DECLARATION_RE = re.compile(r'\bpackage\s+(?!body\b)\w+\s+is\b', re.IGNORECASE)
+
+class _ExpressionEvaluator:
+    """Recursive-descent evaluator for static integer VHDL expressions.
+
+    Supports + - * / mod rem ** abs, parentheses, decimal and based
+    literals, minimum/maximum and names, which lookup(parts) turns into
+    values. Anything else raises _Unresolved; nothing is ever executed.
+    """
+
+    def __init__(self, tokens, lookup):
+        self.tokens = tokens
+        self.pos = 0
+        self.lookup = lookup
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1].lower()
+        return None
+
+    def take(self):
+        if self.pos >= len(self.tokens):
+            raise _Unresolved("unexpected end of expression")
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def expect(self, value):
+        if self.take()[1] != value:
+            raise _Unresolved(f"expected '{value}'")
+
+    def evaluate(self):
+        value = self.expression()
+        if self.pos != len(self.tokens):
+            raise _Unresolved("trailing tokens")
+        return value
+
+    def expression(self):
+        sign = self.take()[1] if self.peek() in ('+', '-') else '+'
+        value = self.term()
+        if sign == '-':
+            value = -value
+        while self.peek() in ('+', '-'):
+            operator = self.take()[1]
+            operand = self.term()
+            value = value + operand if operator == '+' else value - operand
+        return value
+
+    def term(self):
+        value = self.factor()
+        while self.peek() in ('*', '/', 'mod', 'rem'):
+            operator = self.take()[1].lower()
+            operand = self.factor()
+            if operator == '*':
+                value *= operand
+                continue
+            if operand == 0:
+                raise _Unresolved("division by zero")
+            if operator == 'mod':
+                value %= operand
+            else:
+                # '/' and rem truncate towards zero in VHDL
+                quotient = abs(value) // abs(operand)
+                if (value < 0) != (operand < 0):
+                    quotient = -quotient
+                value = quotient if operator == '/' else value - operand * quotient
+        return value
+
+    def factor(self):
+        if self.peek() == 'abs':
+            self.take()
+            return abs(self.primary())
+        value = self.primary()
+        if self.peek() == '**':
+            self.take()
+            exponent = self.primary()
+            if not 0 <= exponent <= 1024:
+                raise _Unresolved("exponent out of range")
+            value **= exponent
+        return value
+
+    def primary(self):
+        kind, value = self.take()
+        if value == '(':
+            result = self.expression()
+            self.expect(')')
+            return result
+        if kind == 'number':
+            text = value.replace('_', '')
+            based = _BASED_LITERAL_RE.match(text)
+            if based:
+                return int(based.group(2), int(based.group(1)))
+            if text.isdigit():
+                return int(text)
+            raise _Unresolved(f"not an integer literal: {value}")
+        if kind != 'ident':
+            raise _Unresolved(f"unexpected '{value}'")
+
+        parts = [value.lower()]
+        while (self.peek() == '.' and self.pos + 1 < len(self.tokens)
+               and self.tokens[self.pos + 1][0] == 'ident'):
+            self.take()
+            parts.append(self.take()[1].lower())
+        if self.peek() == '(':
+            function = _RESOLVER_FUNCTIONS.get(parts[-1])
+            if function is None:
+                raise _Unresolved(f"unknown function {'.'.join(parts)}")
+            self.take()
+            arguments = [self.expression()]
+            while self.peek() == ',':
+                self.take()
+                arguments.append(self.expression())
+            self.expect(')')
+            return function(*arguments)
+        return self.lookup(parts)
+
+def _split_range(tokens):
+    """Split 'left to|downto right' at top level; direction is None if absent."""
+    depth = 0
+    for index, (kind, value) in enumerate(tokens):
+        if value == '(':
+            depth += 1
+        elif value == ')':
+            depth -= 1
+        elif depth == 0 and kind == 'ident' and value.lower() in ('to', 'downto'):
+            return tokens[:index], tokens[index], tokens[index + 1:]
+    return tokens, None, None
+
+def collect_packages(paths):
+    """Return the Package declarations of the given source files.
+
+    Files are only parsed when a quick text search finds a package
+    declaration, so a pass over a large tree is mostly plain reads.
+    """
+    packages = []
+    for path in paths:
+        try:
+            with open(path, 'r', errors='replace') as file:
+                text = file.read()
+        except OSError:
+            continue
+        if _PACKAGE_DECLARATION_RE.search(text):
+            packages.extend(u for u in iter_design_units(text) if isinstance(u, Package))
+    return packages
+
+class ConstantResolver:
+    """Evaluate range bounds against generic defaults and package constants.
+
+    Packages are added as parsed Package records, or looked up on demand in
+    a ProjectIndex database given by index_path. Each package constant is
+    evaluated at most once and the result cached, so one resolver can be
+    shared by every entity of a bulk run. Selected names (pkg.NAME,
+    work.pkg.NAME) are looked up in that package; a plain name is a generic
+    of the entity, a constant of the same package, or else a constant that
+    exactly one known package declares.
+
+    Resolvers are picklable (the index connection is reopened), so they
+    can be passed to worker processes.
+    """
+
+    def __init__(self, packages=(), index_path=None):
+        self.packages = {}
+        self.index_path = index_path
+        self._index = None
+        self._values = {}
+        self._fingerprint = None
+        self.add_packages(packages)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_index'] = None
+        return state
+
+    def add_packages(self, packages):
+        """Make the constants of Package records available."""
+        for package in packages:
+            constants = self.packages.setdefault(package.name.lower(), {})
+            for constant in package.constants:
+                if constant.value is not None or constant.name.lower() not in constants:
+                    constants[constant.name.lower()] = constant
+        self._values.clear()
+        self._fingerprint = None
+
+    def preload(self):
+        """Evaluate every known package constant now.
+
+        Copies of the resolver sent to worker processes then carry the
+        values instead of evaluating them again in every worker.
+        """
+        for package, constants in list(self.packages.items()):
+            for name in list(constants):
+                try:
+                    self._constant_value(package, name, set())
+                except _Unresolved:
+                    pass
+        self.fingerprint()
+
+    def _db(self):
+        if self._index is None and self.index_path is not None:
+            self._index = ProjectIndex(self.index_path)
+        return self._index
+
+    def fingerprint(self):
+        """Return a hash of every constant the resolver can see."""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for name in sorted(self.packages):
+                for constant in sorted(self.packages[name].values()):
+                    digest.update(repr((name, constant)).encode('utf-8'))
+            if self._db() is not None:
+                for row in self._index.db.execute(
+                        "SELECT k.name_lc, c.name_lc, c.value FROM constants c "
+                        "JOIN packages k ON k.id = c.package_id "
+                        "ORDER BY k.name_lc, c.name_lc, c.value"):
+                    digest.update(repr(row).encode('utf-8'))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def _find(self, package, name):
+        """Return the Constant name of package, or None."""
+        constant = self.packages.get(package, {}).get(name)
+        if constant is None and self._db() is not None:
+            for _, found, _ in self._index.find_constant(name, package):
+                if constant is None or found.value is not None:
+                    constant = found
+            if constant is not None:
+                self.packages.setdefault(package, {})[name] = constant
+        return constant
+
+    def _owners(self, name):
+        """Return the names of the packages that declare constant name."""
+        owners = {package for package, constants in self.packages.items() if name in constants}
+        if self._db() is not None:
+            owners.update(package.lower() for package, _, _ in self._index.find_constant(name))
+        return owners
+
+    def _constant_value(self, package, name, active):
+        """Evaluate a package constant, caching the result."""
+        key = (package, name)
+        if key in self._values:
+            value = self._values[key]
+        elif key in active:
+            raise _Unresolved(f"circular definition of {package}.{name}")
+        else:
+            constant = self._find(package, name)
+            value = None
+            if constant is not None and constant.value is not None:
+                active.add(key)
+                try:
+                    value = self._evaluate_tokens(list(_tokenize(constant.value)), {},
+                                                  package, active)
+                except _Unresolved:
+                    value = None
+                finally:
+                    active.discard(key)
+            self._values[key] = value
+        if value is None:
+            raise _Unresolved(f"cannot resolve {package}.{name}")
+        return value
+
+    def _evaluate_tokens(self, tokens, generics, package, active):
+        """Evaluate tokens with generics (name -> default text) and a current package."""
+        def lookup(parts):
+            if len(parts) >= 2:
+                return self._constant_value(parts[-2], parts[-1], active)
+            name = parts[0]
+            if name in generics:
+                if ('generic', name) in active:
+                    raise _Unresolved(f"circular generic {name}")
+                default = generics[name]
+                if default is None:
+                    raise _Unresolved(f"generic {name} has no default")
+                active.add(('generic', name))
+                try:
+                    return self._evaluate_tokens(list(_tokenize(default)), generics,
+                                                 package, active)
+                finally:
+                    active.discard(('generic', name))
+            if package is not None and self._find(package, name) is not None:
+                return self._constant_value(package, name, active)
+            owners = self._owners(name)
+            if len(owners) != 1:
+                raise _Unresolved(f"{name} is unknown or ambiguous")
+            return self._constant_value(owners.pop(), name, active)
+
+        return _ExpressionEvaluator(tokens, lookup).evaluate()
+
+    def evaluate(self, expression, generics=()):
+        """Return the integer value of an expression, or None if it cannot be resolved."""
+        defaults = {g.name.lower(): g.default for g in generics}
+        try:
+            return self._evaluate_tokens(list(_tokenize(expression)), defaults, None, set())
+        except _Unresolved:
+            return None
+
+    def resolve_type(self, type_text, generics=()):
+        """Replace the range bounds of a subtype indication by their values.
+
+        'std_logic_vector(WIDTH*2-1 downto 0)' becomes
+        'std_logic_vector(15 downto 0)' when WIDTH defaults to 8. Bounds
+        that cannot be resolved are kept as written, and a type without
+        any resolvable range is returned unchanged.
+        """
+        if '(' not in type_text and ' range ' not in type_text.lower():
+            return type_text
+        defaults = {g.name.lower(): g.default for g in generics}
+        tokens = list(_tokenize(type_text))
+        resolved, changed = self._resolve_constraints(tokens, defaults)
+        return _join_tokens(resolved) if changed else type_text
+
+    def _resolve_constraints(self, tokens, generics):
+        """Resolve every range inside parentheses or after 'range'."""
+        out = []
+        changed = False
+        index = 0
+        while index < len(tokens):
+            kind, value = tokens[index]
+            if value == '(':
+                depth = 0
+                for end in range(index, len(tokens)):
+                    if tokens[end][1] == '(':
+                        depth += 1
+                    elif tokens[end][1] == ')':
+                        depth -= 1
+                        if depth == 0:
+                            break
+                inner = tokens[index + 1:end]
+                out.append(tokens[index])
+                part = []
+                depth = 0
+                for token in inner + [('op', ',')]:
+                    if token[1] == '(':
+                        depth += 1
+                    elif token[1] == ')':
+                        depth -= 1
+                    elif token[1] == ',' and depth == 0:
+                        part, part_changed = self._resolve_range(part, generics)
+                        out.extend(part)
+                        out.append(token)
+                        changed = changed or part_changed
+                        part = []
+                        continue
+                    part.append(token)
+                out.pop()
+                out.append(tokens[end])
+                index = end + 1
+            elif kind == 'ident' and value.lower() == 'range':
+                out.append(tokens[index])
+                rest, rest_changed = self._resolve_range(tokens[index + 1:], generics)
+                out.extend(rest)
+                changed = changed or rest_changed
+                break
+            else:
+                out.append(tokens[index])
+                index += 1
+        return out, changed
+
+    def _resolve_range(self, tokens, generics):
+        """Resolve one 'left to|downto right' range, or recurse into nested constraints."""
+        left, direction, right = _split_range(tokens)
+        if direction is None:
+            return self._resolve_constraints(tokens, generics)
+        values = []
+        for bound in (left, right):
+            try:
+                values.append(self._evaluate_tokens(bound, generics, None, set()))
+            except _Unresolved:
+                return tokens, False
+        return [('number', str(values[0])), direction, ('number', str(values[1]))], True
+
+# Largest number of distinct vectors exhaustive stimulus may enumerate
+MAX_EXHAUSTIVE_BITS = 24
+
+# Vectors generated and formatted per NumPy batch
+STIMULUS_BATCH = 64 * 1024
+
+# Input names treated as resets: rst, reset, rst_n, nrst, arst, sys_reset, ...
+_RESET_NAME_RE = re.compile(r'(?:^|_)[ans]?(?:rst|reset)(?:_?n|_b)?(?:$|_)', re.IGNORECASE)
+_ACTIVE_LOW_RESET_RE = re.compile(r'(?:rst|reset)(?:_?n|_b)$|(?:^|_)n(?:rst|reset)', re.IGNORECASE)
+
+# Resolved subtype indications that can be driven from a vector file
+_SCALAR_TYPES = ('std_logic', 'std_ulogic', 'bit')
+_VECTOR_TYPES = ('std_logic_vector', 'std_ulogic_vector', 'unsigned', 'signed', 'bit_vector')
+_VECTOR_TYPE_RE = re.compile(r'(\w+)\((-?\d+) (downto|to) (-?\d+)\)$')
+_INTEGER_RANGE_RE = re.compile(r'(integer|natural|positive) range (\d+) to (\d+)$', re.IGNORECASE)
+
+class StimulusSpec(namedtuple('StimulusSpec', 'mode count seed constraints format')):
+    """How to generate a stimulus vector file.
+
+    mode is 'random', 'exhaustive' or 'constrained', count the number of
+    random or constrained vectors, constraints a tuple of (port name, low,
+    high) and format 'hex' or 'bin'.
+    """
+    __slots__ = ()
+
+class StimulusColumn(namedtuple('StimulusColumn', 'port type_mark width low high')):
+    """One input port driven from the vector file, with its value range."""
+    __slots__ = ()
+
+def is_reset_name(name):
+    """Return True for port names that look like a reset."""
+    return _RESET_NAME_RE.search(name) is not None
+
+def reset_active_level(name):
+    """Return the asserted level of a reset port, '0' for active-low names."""
+    return '0' if _ACTIVE_LOW_RESET_RE.search(name) else '1'
+
+def _port_column(port, generics, resolver):
+    """Return the StimulusColumn of a port, or None if its type is not supported.
+
+    Supported are scalars, vectors with constant bounds (resolved against
+    the generic defaults and, with package constants, by the resolver) and
+    non-negative integer ranges.
+    """
+    type_text = resolver.resolve_type(port.type, generics)
+    if type_text.lower() in _SCALAR_TYPES:
+        return StimulusColumn(port, type_text.lower(), 1, 0, 1)
+    match = _VECTOR_TYPE_RE.match(type_text)
+    if match and match.group(1).lower() in _VECTOR_TYPES:
+        width = abs(int(match.group(2)) - int(match.group(4))) + 1
+        return StimulusColumn(port, match.group(1).lower(), width, 0, (1 << width) - 1)
+    match = _INTEGER_RANGE_RE.match(type_text)
+    if match and int(match.group(2)) <= int(match.group(3)):
+        low, high = int(match.group(2)), int(match.group(3))
+        return StimulusColumn(port, 'integer', max(1, high.bit_length()), low, high)
+    return None
+
+def stimulus_columns(entity, resolver=None):
+    """Return (columns, skipped port names) for the inputs of the vector file.
+
+    Every input except the clock and resets becomes a column if its type
+    is supported (see _port_column); the others are reported as skipped.
+    """
+    resolver = resolver or ConstantResolver()
+    clock = entity.clock_port()
+    columns = []
+    skipped = []
+    for port in entity.ports:
+        if port.direction != 'in' or port is clock or is_reset_name(port.name):
+            continue
+        column = _port_column(port, entity.generics, resolver)
+        if column is None:
+            skipped.append(port.name)
+        else:
+            columns.append(column)
+    return columns, skipped
+
+def expected_columns(entity, model, resolver=None):
+    """Return (columns, skipped port names) for the outputs a golden model checks.
+
+    These are the outputs named by the model, or every out and buffer port
+    of a supported type when it names none.
+    """
+    resolver = resolver or ConstantResolver()
+    wanted = None if model.outputs is None else {name.lower() for name in model.outputs}
+    columns = []
+    skipped = []
+    for port in entity.ports:
+        if port.direction not in ('out', 'buffer'):
+            continue
+        if wanted is not None and port.name.lower() not in wanted:
+            continue
+        column = _port_column(port, entity.generics, resolver)
+        if column is None or column.width > 64:
+            if wanted is not None:
+                raise ValueError(f"golden model output '{port.name}' of {entity.name} "
+                                 f"needs a constant width of at most 64 bits")
+            skipped.append(port.name)
+        else:
+            columns.append(column)
+    if wanted is not None:
+        missing = wanted - {p.name.lower() for p in entity.ports if p.direction in ('out', 'buffer')}
+        if missing:
+            raise ValueError(f"golden model of {entity.name} names unknown outputs: "
+                             f"{', '.join(sorted(missing))}")
+    return columns, skipped
+
+# Golden models by lower-case entity name, see register_golden_model
+GOLDEN_MODELS = {}
+
+# Content digest of each golden model file executed in this process
+_LOADED_GOLDEN_FILES = {}
+
+class GoldenModel(namedtuple('GoldenModel', 'function outputs latency')):
+    """A reference model: function maps {input: array} to {output: array}.
+
+    outputs limits the checked outputs (None checks all supported ones),
+    and latency is the number of clock cycles the DUT takes to respond.
+    """
+    __slots__ = ()
+
+def register_golden_model(entity_name, function=None, outputs=None, latency=0):
+    """Register the golden model of an entity; also usable as a decorator.
+
+    function receives a dict of NumPy arrays, one per input column (int64
+    for signed and integer ports, uint64 otherwise), holding a whole batch
+    of vectors, and returns a dict of arrays or scalars per output.
+    """
+    if latency < 0:
+        raise ValueError("golden model latency must not be negative")
+
+    def register(function):
+        GOLDEN_MODELS[entity_name.lower()] = GoldenModel(
+            function, tuple(outputs) if outputs is not None else None, latency)
+        return function
+
+    return register if function is None else register(function)
+
+def load_golden_models(path):
+    """Execute a Python file that registers golden models and return its digest.
+
+    The file is executed again only when its content has changed.
+
+    The file sees register_golden_model as golden_model and NumPy as numpy,
+    so it needs no imports:
+
+        @golden_model('adder', latency=1)
+        def adder(inputs):
+            return {'sum': inputs['a'] + inputs['b']}
+    """
+    path = os.path.abspath(path)
+    with open(path, 'r') as file:
+        source = file.read()
+    digest = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    if _LOADED_GOLDEN_FILES.get(path) == digest:
+        return digest
+    namespace = {'__file__': path, '__name__': 'tbgen_golden_models',
+                 'golden_model': register_golden_model, 'numpy': numpy}
+    exec(compile(source, path, 'exec'), namespace)
+    _LOADED_GOLDEN_FILES[path] = digest
+    return digest
+
+def vector_path_for(input_file_path, entity_name):
+    """Return the stimulus vector file path for an entity of a VHDL source file."""
+    return os.path.join(os.path.dirname(input_file_path), f"{entity_name}_tb.vec")
+
+def _column_bounds(column, constraints):
+    """Return the (low, high) values to draw for a column."""
+    if column.port.name.lower() not in constraints:
+        return column.low, column.high
+    low, high = constraints[column.port.name.lower()]
+    if column.type_mark == 'signed':
+        minimum, maximum = -(1 << (column.width - 1)), (1 << (column.width - 1)) - 1
+    else:
+        minimum, maximum = column.low, column.high
+    if not minimum <= low <= high <= maximum:
+        raise ValueError(f"constraint {low}:{high} on '{column.port.name}' is outside "
+                         f"{minimum}:{maximum} or empty")
+    if high >= 1 << 64 or low < -(1 << 63):
+        raise ValueError(f"constraint on '{column.port.name}' must fit in 64 bits")
+    return low, high
+
+def _draw_column(rng, column, low, high, count):
+    """Draw count values in [low, high] as uint64 limbs, least significant first."""
+    if low < 0:
+        values = rng.integers(low, high, size=count, dtype=numpy.int64, endpoint=True)
+        mask = numpy.uint64((1 << column.width) - 1)
+        return [values.astype(numpy.uint64) & mask]
+    if high < 1 << 64:
+        return [rng.integers(low, high, size=count, dtype=numpy.uint64, endpoint=True)]
+    # Full range of a port wider than 64 bits: one random limb per 64 bits
+    return [rng.integers(0, (1 << min(64, column.width - bit)) - 1, size=count,
+                         dtype=numpy.uint64, endpoint=True)
+            for bit in range(0, column.width, 64)]
+
+def _format_vectors(columns, limbs, count, vector_format):
+    """Render a batch of vectors, one per line, as ASCII bytes.
+
+    Each column becomes a fixed-width field of hex or binary digits, and
+    the digits of a whole batch are extracted with array operations, so
+    there is no per-vector Python work.
+    """
+    bits_per_digit = 4 if vector_format == 'hex' else 1
+    digit_mask = numpy.uint64((1 << bits_per_digit) - 1)
+    table = numpy.frombuffer(b'0123456789abcdef', dtype=numpy.uint8)
+    parts = []
+    for column, column_limbs in zip(columns, limbs):
+        if parts:
+            parts.append(numpy.full((count, 1), ord(' '), dtype=numpy.uint8))
+        digits = -(-column.width // bits_per_digit)
+        chars = numpy.full((count, digits), ord('0'), dtype=numpy.uint8)
+        for k in range(digits):
+            bit = k * bits_per_digit
+            if bit // 64 < len(column_limbs):
+                digit = (column_limbs[bit // 64] >> numpy.uint64(bit % 64)) & digit_mask
+                chars[:, digits - 1 - k] = table[digit]
+        parts.append(chars)
+    parts.append(numpy.full((count, 1), ord('\n'), dtype=numpy.uint8))
+    return numpy.hstack(parts).tobytes()
+
+def _model_values(column, limbs):
+    """Return the values of a column as a model input array."""
+    values = limbs[0]
+    if column.type_mark == 'signed' and column.width < 64:
+        # Sign-extend the two's complement bit pattern
+        sign = numpy.uint64(1 << (column.width - 1))
+        return (values ^ sign).astype(numpy.int64) - numpy.int64(1 << (column.width - 1))
+    if column.type_mark in ('signed', 'integer'):
+        return values.astype(numpy.int64)
+    return values
+
+class _GoldenChecker:
+    """Evaluate a golden model batch by batch and delay its results by the latency."""
+
+    def __init__(self, entity, model, columns, outputs):
+        self.entity = entity
+        self.model = model
+        self.columns = columns
+        self.outputs = outputs
+        wide = [c.port.name for c in columns if c.width > 64]
+        if wide:
+            raise ValueError(f"golden models take inputs of at most 64 bits; "
+                             f"{entity.name} has {', '.join(wide)}")
+        # Results still to be written, and whether they are real results
+        self.pending = [numpy.zeros(model.latency, dtype=numpy.uint64) for _ in outputs]
+        self.pending_valid = numpy.zeros(model.latency, dtype=numpy.uint64)
+
+    def expected(self, limbs, count):
+        """Return ([flag limbs], [expected limbs per output]) for one batch."""
+        inputs = {column.port.name: _model_values(column, column_limbs)
+                  for column, column_limbs in zip(self.columns, limbs)}
+        results = self.model.function(inputs)
+        if not isinstance(results, dict):
+            raise ValueError(f"golden model of {self.entity.name} must return a dict")
+        lowered = {str(name).lower(): value for name, value in results.items()}
+        expected = []
+        for index, column in enumerate(self.outputs):
+            if column.port.name.lower() not in lowered:
+                raise ValueError(f"golden model of {self.entity.name} returned no "
+                                 f"value for '{column.port.name}'")
+            values = numpy.broadcast_to(numpy.asarray(lowered[column.port.name.lower()]),
+                                        (count,))
+            if values.dtype.kind == 'i':
+                values = values.astype(numpy.int64).astype(numpy.uint64)
+            values = values.astype(numpy.uint64) & numpy.uint64((1 << column.width) - 1)
+            stream = numpy.concatenate((self.pending[index], values))
+            expected.append([stream[:count]])
+            self.pending[index] = stream[count:]
+        valid = numpy.concatenate((self.pending_valid, numpy.ones(count, dtype=numpy.uint64)))
+        self.pending_valid = valid[count:]
+        return [valid[:count]], expected
+
+def iter_stimulus_batches(entity, spec, resolver=None, model=None):
+    """Yield the vector file of an entity in ASCII chunks of up to STIMULUS_BATCH lines.
+
+    Values are drawn with NumPy from a generator seeded with the spec seed
+    and the entity name, so output is reproducible per entity. With a
+    GoldenModel every line also carries a check flag and the expected
+    outputs, computed by calling the model once per batch; the first
+    latency lines have the flag cleared.
+    """
+    if numpy is None:
+        raise RuntimeError("stimulus generation needs NumPy, which is not installed")
+    columns, _ = stimulus_columns(entity, resolver)
+    if not columns:
+        return
+    checker = None
+    line_columns = columns
+    if model is not None:
+        outputs, _ = expected_columns(entity, model, resolver)
+        if outputs:
+            checker = _GoldenChecker(entity, model, columns, outputs)
+            flag = StimulusColumn(None, 'flag', 1, 0, 1)
+            line_columns = columns + [flag] + outputs
+
+    for limbs, count in _input_batches(entity, spec, columns):
+        if checker is not None:
+            flags, expected = checker.expected(limbs, count)
+            limbs = limbs + [flags] + expected
+        yield _format_vectors(line_columns, limbs, count, spec.format)
+
+def _input_bounds(entity, spec, columns):
+    """Return the (low, high) of every column, checking constraints and exhaustive size."""
+    constraints = {name.lower(): (low, high) for name, low, high in spec.constraints}
+    known = {column.port.name.lower() for column in columns}
+    for name in constraints:
+        if name not in known:
+            raise ValueError(f"constraint on '{name}', which is not a driven input of {entity.name}")
+    bounds = [_column_bounds(column, constraints) for column in columns]
+    if spec.mode == 'exhaustive':
+        total = 1
+        for low, high in bounds:
+            total *= high - low + 1
+        if total > 1 << MAX_EXHAUSTIVE_BITS:
+            raise ValueError(f"exhaustive stimulus for {entity.name} needs {total} vectors, "
+                             f"more than 2**{MAX_EXHAUSTIVE_BITS}; use random or constrained")
+    return bounds
+
+def check_stimulus(entity, spec, resolver=None, model=None):
+    """Check that the vector file of an entity can be generated.
+
+    Raises the error that write_vector_file would raise for the settings,
+    so callers can check before replacing a testbench that reads the file.
+    Returns False for an entity without inputs that can be driven, which
+    gets no vector file.
+    """
+    if numpy is None:
+        raise RuntimeError("stimulus generation needs NumPy, which is not installed")
+    columns, _ = stimulus_columns(entity, resolver)
+    if not columns:
+        return False
+    _input_bounds(entity, spec, columns)
+    if model is not None:
+        outputs, _ = expected_columns(entity, model, resolver)
+        if outputs:
+            _GoldenChecker(entity, model, columns, outputs)
+    return True
+
+def _input_batches(entity, spec, columns):
+    """Yield (limbs per column, count) for each batch of input vectors."""
+    bounds = _input_bounds(entity, spec, columns)
+
+    if spec.mode == 'exhaustive':
+        # Mixed-radix counter over every column, last column fastest
+        radices = [high - low + 1 for low, high in bounds]
+        total = 1
+        for radix in radices:
+            total *= radix
+        strides = []
+        stride = 1
+        for radix in reversed(radices):
+            strides.append(stride)
+            stride *= radix
+        strides.reverse()
+        for start in range(0, total, STIMULUS_BATCH):
+            index = numpy.arange(start, min(total, start + STIMULUS_BATCH), dtype=numpy.uint64)
+            limbs = []
+            for (low, high), radix, stride, column in zip(bounds, radices, strides, columns):
+                values = (index // numpy.uint64(stride)) % numpy.uint64(radix)
+                if low < 0:
+                    mask = numpy.uint64((1 << column.width) - 1)
+                    values = (values.astype(numpy.int64) + low).astype(numpy.uint64) & mask
+                else:
+                    values = values + numpy.uint64(low)
+                limbs.append([values])
+            yield limbs, len(index)
+        return
+
+    rng = numpy.random.default_rng([spec.seed, zlib.crc32(entity.name.encode('utf-8'))])
+    for start in range(0, spec.count, STIMULUS_BATCH):
+        count = min(STIMULUS_BATCH, spec.count - start)
+        limbs = [_draw_column(rng, column, low, high, count)
+                 for column, (low, high) in zip(columns, bounds)]
+        yield limbs, count
+
+def write_vector_file(path, entity, spec, resolver=None, model=None):
+    """Write the stimulus vectors of an entity; returns True if the file changed.
+
+    Nothing is written for an entity without inputs that can be driven.
+    """
+    if not stimulus_columns(entity, resolver)[0]:
+        return False
+    with AtomicTextWriter(path) as out:
+        for chunk in iter_stimulus_batches(entity, spec, resolver, model):
+            out.write(chunk.decode('ascii'))
+    return out.written
 
 class VHDLTestbenchGenerator:
-    def __init__(self):
-        self.entity_name = ""
-        self.ports = []
-        self.generics = []
-        
+    def __init__(self, timestamp='now', resolver=None, stimulus=None, golden=(),
+                 vhdl_std='93', watchdog=DEFAULT_WATCHDOG, instantiation='component',
+                 bundle=False):
+        """Create a generator.
+
+        timestamp controls the "Generated on" header line: 'now' stamps the
+        current time (or SOURCE_DATE_EPOCH when that is set), None leaves the
+        line out, and any other string is written verbatim as a pinned value.
+
+        resolver, a ConstantResolver, makes the component declaration and
+        the testbench signals use literal range bounds, and the generic
+        values literals, evaluated from generic defaults and package
+        constants, since neither is visible inside the testbench.
+
+        stimulus, a StimulusSpec, makes the stimulus process stream input
+        vectors from a file (see write_vector_file) instead of leaving a
+        placeholder.
+
+        golden, paths of Python files registering golden models (see
+        load_golden_models), makes the vector file carry expected outputs
+        for those entities and the testbench compare against them. Paths
+        rather than functions are held so the options stay picklable.
+
+        Testbenches stop their clock once the stimulus is done, so the
+        simulation runs out of events; with vhdl_std '2008' they also call
+        std.env.finish. watchdog, a VHDL time literal such as '1 ms' or None
+        for none, fails simulations that have not finished by then.
+
+        instantiation 'entity' instantiates the DUT directly as entity
+        work.<name> instead of declaring a component, which removes a copy
+        of the interface; the DUT must then be analyzed first. bundle
+        gathers the port signals into one record per mode (dut_in, dut_out
+        and dut_inout).
+
+        The generator only holds these options; parsed entities are returned
+        to the caller, so one instance can be reused across files and threads.
+        """
+        self.timestamp = timestamp
+        self.resolver = resolver
+        self.stimulus = stimulus
+        self.golden = tuple(golden)
+        self.vhdl_std = vhdl_std
+        self.watchdog = watchdog
+        self.instantiation = instantiation
+        self.bundle = bundle
+
     def parse_vhdl_file(self, vhdl_content):
-        """Parse VHDL file content to extract entity information."""
-        # Find entity declaration
-        entity_match = re.search(r'entity\s+(\w+)\s+is', vhdl_content, re.IGNORECASE)
-        if entity_match:
-            self.entity_name = entity_match.group(1)
-        
-        # Extract generics
-        generic_section = re.search(r'generic\s*\((.*?)\);', vhdl_content, re.IGNORECASE | re.DOTALL)
-        if generic_section:
-            generic_list = generic_section.group(1)
-            generic_items = re.finditer(r'(\w+)\s*:\s*(\w+)\s*:=\s*([^;,]+)', generic_list)
-            for item in generic_items:
-                self.generics.append({
-                    'name': item.group(1),
-                    'type': item.group(2),
-                    'default': item.group(3).strip()
-                })
-        
-        # Extract ports
-        port_section = re.search(r'port\s*\((.*?)\);', vhdl_content, re.IGNORECASE | re.DOTALL)
-        if port_section:
-            port_list = port_section.group(1)
-            port_items = re.finditer(r'(\w+)\s*:\s*(in|out|inout)\s*(\w+(?:\s*\(\s*[\w\s\-]+\s+downto\s+[\w\s\-]+\s*\))?)', port_list)
-            for item in port_items:
-                self.ports.append({
-                    'name': item.group(1),
-                    'direction': item.group(2),
-                    'type': item.group(3)
-                })
-
-    def generate_testbench(self):
-        """Generate VHDL testbench code."""
-        tb_name = f"{self.entity_name}_tb"
-        
-        # Start with the testbench template
-        testbench = f"""-- Generated VHDL Testbench for {self.entity_name}
--- Generated on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        """Parse VHDL file content and return its first Entity, or None."""
+        return next(iter_vhdl_entities(vhdl_content, max_entities=1), None)
+
+    def _pinned_timestamp(self):
+        """Return the fixed timestamp text, or None when the time is live."""
+        if self.timestamp != 'now':
+            return self.timestamp
+        epoch = os.environ.get('SOURCE_DATE_EPOCH')
+        if epoch:
+            return datetime.fromtimestamp(int(epoch), timezone.utc).strftime(TIMESTAMP_FORMAT)
+        return None
+
+    def timestamp_text(self):
+        """Return the text for the "Generated on" line, or None to omit it."""
+        if self.timestamp is None:
+            return None
+        pinned = self._pinned_timestamp()
+        return pinned if pinned is not None else datetime.now().strftime(TIMESTAMP_FORMAT)
 
+    def options(self):
+        """Return the generator settings that influence the output text."""
+        options = {'template': TEMPLATE_VERSION,
+                   'timestamp': self._pinned_timestamp() or self.timestamp,
+                   'vhdl_std': self.vhdl_std, 'watchdog': self.watchdog,
+                   'instantiation': self.instantiation, 'bundle': self.bundle}
+        if self.resolver is not None:
+            options['resolver'] = self.resolver.fingerprint()
+        if self.stimulus is not None:
+            options['stimulus'] = list(self.stimulus)
+        if self.golden:
+            options['golden'] = [load_golden_models(path) for path in self.golden]
+        return options
+
+    def golden_model(self, entity):
+        """Return the GoldenModel registered for an entity, or None."""
+        if self.stimulus is None or not self.golden:
+            return None
+        for path in self.golden:
+            load_golden_models(path)
+        return GOLDEN_MODELS.get(entity.name.lower())
+
+    def interface_key(self, entity):
+        """Hash the normalized entity interface together with the options.
+
+        Two runs with the same key produce the same testbench, so the key can
+        be used to skip regeneration of unchanged entities.
+        """
+        normalized = {
+            'entity': entity.name,
+            'generics': entity.generics,
+            'ports': entity.ports,
+            'options': self.options(),
+        }
+        encoded = json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def generate_testbench(self, entity, name=None):
+        """Generate VHDL testbench code for an Entity."""
+        buffer = io.StringIO()
+        self.emit_testbench(entity, stream=buffer, name=name)
+        return buffer.getvalue()
+
+    def emit_testbench(self, entity, stream, name=None):
+        """Write the testbench for an Entity to a text stream.
+
+        Each section is written as soon as it is produced and the ports are
+        walked once per section without building intermediate lists, so
+        memory use stays flat however many ports the entity has. name, used
+        for generic sweeps, replaces the entity name in the names of the
+        testbench entity (<name>_tb) and its vector file.
+        """
+        write = stream.write
+        columns = None
+        outputs = ()
+        if self.stimulus is not None:
+            columns, skipped = stimulus_columns(entity, self.resolver)
+            model = self.golden_model(entity)
+            if columns and model is not None:
+                outputs, _ = expected_columns(entity, model, self.resolver)
+        self._emit_header(entity, write, vectors=bool(columns), name=name)
+        if self.instantiation == 'component':
+            self._emit_component(entity, write)
+        clock_signal = self._emit_signals(entity, write)
+        if outputs:
+            self._emit_image_function(write)
+        write("\nbegin\n")
+        self._emit_instance(entity, write)
+        if clock_signal is not None:
+            self._emit_clock_process(entity, write, clock_signal)
+        if self.watchdog is not None:
+            self._emit_watchdog(write)
+        if columns:
+            self._emit_vector_stimulus(entity, write, columns, skipped, clock_signal, outputs)
+        else:
+            self._emit_stimulus(entity, write)
+        write("\nend behavior;")
+
+    def _emit_header(self, entity, write, vectors=False, name=None):
+        tb_name = f"{name or entity.name}_tb"
+        write(f"-- Generated VHDL Testbench for {entity.name}\n")
+        timestamp = self.timestamp_text()
+        if timestamp is not None:
+            write(f"-- Generated on: {timestamp}\n")
+        write("""
 library ieee;
 use ieee.std_logic_1164.all;
 use ieee.numeric_std.all;
+""")
+        if vectors:
+            write(f"""use ieee.std_logic_textio.all;
+use std.textio.all;
 
 entity {tb_name} is
+    generic (
+        VECTOR_FILE : string := "{tb_name}.vec"
+    );
 end entity {tb_name};
-
+""")
+        else:
+            write(f"""
+entity {tb_name} is
+end entity {tb_name};
+""")
+        write(f"""
 architecture behavior of {tb_name} is
-    -- Component Declaration
-    component {self.entity_name} is"""
+""")
+
+    def _emit_component(self, entity, write):
+        write("    -- Component Declaration\n")
+        write(f"    component {entity.name} is")
 
         # Add generics if they exist
-        if self.generics:
-            testbench += "\n        generic (\n"
-            generic_lines = []
-            for generic in self.generics:
-                generic_lines.append(
-                    f"            {generic['name']} : {generic['type']} := {generic['default']}"
-                )
-            testbench += ";\n".join(generic_lines) + "\n        );"
-
-        # Add ports
-        testbench += "\n        port (\n"
-        port_lines = []
-        for port in self.ports:
-            port_lines.append(
-                f"            {port['name']} : {port['direction']} {port['type']}"
-            )
-        testbench += ";\n".join(port_lines) + "\n        );\n"
-        testbench += "    end component;\n\n"
-
-        # Add signals
-        testbench += "    -- Signals\n"
-        for port in self.ports:
-            testbench += f"    signal {port['name']}_tb : {port['type']};\n"
+        generics = [g for g in entity.generics if not self._follows_generics(entity, g)]
+        if generics:
+            write("\n        generic (\n")
+            _write_separated(write, (
+                f"            {g.name} : {g.type}"
+                + (f" := {self._generic_value(entity, g)}" if g.default is not None else "")
+                for g in generics
+            ), ";\n")
+            write("\n        );")
 
-        # Add clock and reset if they exist
-        has_clock = any(port['name'].lower().startswith(('clk', 'clock')) for port in self.ports)
-        has_reset = any(port['name'].lower().startswith(('rst', 'reset')) for port in self.ports)
-        
-        if has_clock:
-            testbench += "\n    -- Clock period definitions\n"
-            testbench += "    constant clk_period : time := 10 ns;\n"
+        # Add ports if they exist
+        if entity.ports:
+            write("\n        port (\n")
+            _write_separated(write, (
+                f"            {p.name} : {p.direction} {self._port_type(entity, p)}"
+                for p in entity.ports
+            ), ";\n")
+            write("\n        );")
+        write("\n    end component;\n\n")
 
-        testbench += "\nbegin\n"
-        
+    def _signal(self, port):
+        """Return the testbench signal connected to a port."""
+        bundle = _BUNDLE_SIGNALS.get(port.direction) if self.bundle else None
+        return f"{bundle}.{port.name}" if bundle else f"{port.name}_tb"
+
+    def _port_type(self, entity, port):
+        if self.resolver is not None:
+            return self.resolver.resolve_type(port.type, entity.generics)
+        return port.type
+
+    def _generic_value(self, entity, generic):
+        """Return the default of a generic, as a literal when the resolver can evaluate it."""
+        if self.resolver is not None:
+            value = self.resolver.evaluate(generic.default, entity.generics)
+            if value is not None:
+                return str(value)
+        return generic.default
+
+    def _follows_generics(self, entity, generic):
+        """Return True when a default stays an expression of other generics.
+
+        With a resolver, such a generic (DEPTH := clog2(WIDTH), say) is
+        left out of the component and the generic map, so the DUT computes
+        it from the generics that are mapped instead of the testbench
+        naming generics it cannot see.
+        """
+        if self.resolver is None or generic.default is None:
+            return False
+        if self.resolver.evaluate(generic.default, entity.generics) is not None:
+            return False
+        names = {g.name.lower() for g in entity.generics}
+        return any(kind == 'ident' and value.lower() in names
+                   for kind, value in _tokenize(generic.default))
+
+    def _emit_signals(self, entity, write):
+        """Declare the port signals and return the clock signal name, if any."""
+        write("    -- Signals\n")
+        if self.bundle:
+            for bundle in dict.fromkeys(_BUNDLE_SIGNALS.values()):
+                members = (p for p in entity.ports if _BUNDLE_SIGNALS.get(p.direction) == bundle)
+                first = next(members, None)
+                if first is None:
+                    continue
+                write(f"    type {bundle}_t is record\n")
+                for port in itertools.chain((first,), members):
+                    write(f"        {port.name} : {self._port_type(entity, port)};\n")
+                write("    end record;\n")
+                write(f"    signal {bundle} : {bundle}_t;\n")
+        for port in entity.ports:
+            if not self.bundle or port.direction not in _BUNDLE_SIGNALS:
+                write(f"    signal {port.name}_tb : {self._port_type(entity, port)};\n")
+
+        clock = entity.clock_port()
+        clock_signal = self._signal(clock) if clock is not None else None
+
+        if clock_signal is not None:
+            write("\n    -- Clock period definitions\n")
+            write("    constant clk_period : time := 10 ns;\n")
+
+        write("\n    -- Set when the stimulus is done; stops the clock and the watchdog\n")
+        write("    signal sim_done : boolean := false;\n")
+        if self.watchdog is not None:
+            write(f"    constant watchdog_time : time := {self.watchdog};\n")
+        return clock_signal
+
+    def _emit_instance(self, entity, write):
         # Instantiate the Unit Under Test (UUT)
-        testbench += "\n    -- Instantiate the Unit Under Test (UUT)\n"
-        testbench += f"    UUT: {self.entity_name}"
-        
-        # Add generic map if generics exist
-        if self.generics:
-            testbench += "\n        generic map (\n"
-            generic_maps = []
-            for generic in self.generics:
-                generic_maps.append(
-                    f"            {generic['name']} => {generic['default']}"
-                )
-            testbench += ",\n".join(generic_maps) + "\n        )"
+        write("\n    -- Instantiate the Unit Under Test (UUT)\n")
+        if self.instantiation == 'entity':
+            write(f"    UUT: entity work.{entity.name}")
+        else:
+            write(f"    UUT: {entity.name}")
+
+        # Add generic map for generics that have a default value
+        mapped_generics = (g for g in entity.generics
+                           if g.default is not None and not self._follows_generics(entity, g))
+        first = next(mapped_generics, None)
+        if first is not None:
+            write("\n        generic map (\n")
+            write(f"            {first.name} => {self._generic_value(entity, first)}")
+            for generic in mapped_generics:
+                write(f",\n            {generic.name} => {self._generic_value(entity, generic)}")
+            write("\n        )")
 
         # Add port map
-        testbench += "\n        port map (\n"
-        port_maps = []
-        for port in self.ports:
-            port_maps.append(
-                f"            {port['name']} => {port['name']}_tb"
-            )
-        testbench += ",\n".join(port_maps) + "\n        );\n"
-
-        # Add clock process if clock exists
-        if has_clock:
-            clock_signal = next(port['name'] for port in self.ports if port['name'].lower().startswith(('clk', 'clock')))
-            testbench += f"""
-    -- Clock process
+        if entity.ports:
+            write("\n        port map (\n")
+            _write_separated(write, (
+                f"            {p.name} => {self._signal(p)}" for p in entity.ports
+            ), ",\n")
+            write("\n        )")
+        write(";\n")
+
+    def _emit_clock_process(self, entity, write, clock_signal):
+        write(f"""
+    -- Clock process, stopped once the stimulus is done
     clk_process: process
     begin
-        {clock_signal}_tb <= '0';
-        wait for clk_period/2;
-        {clock_signal}_tb <= '1';
-        wait for clk_period/2;
+        while not sim_done loop
+            {clock_signal} <= '0';
+            wait for clk_period/2;
+            {clock_signal} <= '1';
+            wait for clk_period/2;
+        end loop;
+        wait;
     end process;
-"""
+""")
+
+    def _emit_watchdog(self, write):
+        write("""
+    -- Watchdog: fails the simulation if the stimulus does not finish in time
+    watchdog_proc: process
+    begin
+        wait until sim_done for watchdog_time;
+        assert sim_done
+            report "watchdog expired after " & time'image(watchdog_time) severity failure;
+        wait;
+    end process;
+""")
+
+    def _emit_finish(self, write):
+        """End a stimulus process; the simulation then runs out of events."""
+        write("        sim_done <= true;\n")
+        if self.vhdl_std == '2008':
+            write("        std.env.finish;\n")
+        write("        wait;\n")
+
+    def _emit_vector_stimulus(self, entity, write, columns, skipped, clock_signal,
+                              outputs=()):
+        """Emit a stimulus process that applies one file vector per clock cycle.
+
+        Inputs in skipped have no constant width or an unsupported type;
+        they are listed in a comment and left for the user to drive. With
+        expected output columns, each line also holds a check flag and the
+        golden model outputs, which are compared halfway through the cycle.
+        """
+        hex_format = self.stimulus.format == 'hex'
+        resets = [p for p in entity.ports
+                  if p.direction == 'in' and is_reset_name(p.name)
+                  and p.type.lower() in _SCALAR_TYPES]
+        write(f"""
+    -- Stimulus process: applies one line of VECTOR_FILE per clock cycle
+    -- ({'hex' if hex_format else 'binary'} columns: {' '.join(c.port.name for c in columns)})
+""")
+        if outputs:
+            write(f"    -- followed by a check flag and the expected "
+                  f"{' '.join(c.port.name for c in outputs)}\n")
+        write("""    stim_proc: process
+        file vectors : text open read_mode is VECTOR_FILE;
+        variable row : line;
+""")
+        if skipped:
+            write(f"        -- Not driven from the file: {', '.join(skipped)}\n")
+        for column in list(columns) + list(outputs):
+            bits = -(-column.width // 4) * 4 if hex_format else column.width
+            write(f"        variable v_{column.port.name} : std_logic_vector({bits - 1} downto 0);\n")
+        if outputs:
+            write(f"        variable vector_check : std_logic_vector({3 if hex_format else 0} downto 0);\n")
+            write("        variable vector_count : natural := 0;\n")
+            write("        variable errors : natural := 0;\n")
+        write("    begin\n")
+        for port in resets:
+            write(f"        {self._signal(port)} <= '{reset_active_level(port.name)}';\n")
+        write("        -- hold reset state for 100 ns\n")
+        write("        wait for 100 ns;\n")
+        for port in resets:
+            inactive = '1' if reset_active_level(port.name) == '0' else '0'
+            write(f"        {self._signal(port)} <= '{inactive}';\n")
+        if outputs and clock_signal is not None:
+            # Apply vectors right after a rising edge so checks fall mid-cycle
+            write(f"        wait until rising_edge({clock_signal});\n")
+        write("\n        while not endfile(vectors) loop\n")
+        write("            readline(vectors, row);\n")
+        read = 'hread' if hex_format else 'read'
+        for column in columns:
+            name = column.port.name
+            write(f"            {read}(row, v_{name});\n")
+            write(f"            {self._signal(column.port)} <= {self._vector_conversion(column)};\n")
+        if outputs:
+            write(f"            {read}(row, vector_check);\n")
+            for column in outputs:
+                write(f"            {read}(row, v_{column.port.name});\n")
+            if clock_signal is not None:
+                write(f"            wait until falling_edge({clock_signal});\n")
+            else:
+                write("            wait for 5 ns;\n")
+            write("            if vector_check(0) = '1' then\n")
+            for column in outputs:
+                name = column.port.name
+                actual = self._actual_bits(column)
+                expected = f"v_{name}({column.width - 1} downto 0)"
+                write(f"""                if {actual} /= {expected} then
+                    errors := errors + 1;
+                    report "{name} mismatch at vector " & integer'image(vector_count)
+                        & ": expected " & slv_image({expected})
+                        & ", got " & slv_image({actual}) severity error;
+                end if;
+""")
+            write("            end if;\n")
+            write("            vector_count := vector_count + 1;\n")
+        if clock_signal is not None:
+            write(f"            wait until rising_edge({clock_signal});\n")
+        else:
+            write(f"            wait for {5 if outputs else 10} ns;\n")
+        write("        end loop;\n")
+        if outputs:
+            write(f"""
+        if errors = 0 then
+            report "{entity.name}: " & integer'image(vector_count)
+                & " vectors, no mismatches" severity note;
+        else
+            report "{entity.name}: " & integer'image(vector_count)
+                & " vectors, " & integer'image(errors) & " mismatches" severity error;
+        end if;
+""")
+        write("\n")
+        self._emit_finish(write)
+        write("""    end process;
+""")
+
+    def _actual_bits(self, column):
+        """Return an output signal converted to a std_logic_vector of its width."""
+        signal = self._signal(column.port)
+        if column.type_mark in ('std_logic', 'std_ulogic'):
+            return f"std_logic_vector'(0 => {signal})"
+        if column.type_mark == 'bit':
+            return f"to_stdlogicvector(bit_vector'(0 => {signal}))"
+        if column.type_mark == 'bit_vector':
+            return f"to_stdlogicvector({signal})"
+        if column.type_mark == 'integer':
+            return f"std_logic_vector(to_unsigned({signal}, {column.width}))"
+        return f"std_logic_vector({signal})"
+
+    def _emit_image_function(self, write):
+        """Declare slv_image, which renders a vector as binary text in VHDL-93."""
+        write("""
+    -- Binary text of a vector for mismatch reports
+    function slv_image(value : std_logic_vector) return string is
+        variable bits : std_logic_vector(1 to value'length) := value;
+        variable text : string(1 to value'length);
+    begin
+        for i in text'range loop
+            text(i) := std_logic'image(bits(i))(2);
+        end loop;
+        return text;
+    end function;
+""")
+
+    @staticmethod
+    def _vector_conversion(column):
+        """Return the expression assigning a column's read variable to its signal."""
+        variable = f"v_{column.port.name}"
+        if column.type_mark in ('std_logic', 'std_ulogic'):
+            return f"{variable}(0)"
+        if column.type_mark == 'bit':
+            return f"to_bit({variable}(0))"
+        bits = f"{variable}({column.width - 1} downto 0)"
+        if column.type_mark == 'std_logic_vector':
+            return bits
+        if column.type_mark == 'bit_vector':
+            return f"to_bitvector({bits})"
+        if column.type_mark == 'integer':
+            return f"to_integer(unsigned({bits}))"
+        return f"{column.type_mark}({bits})"
 
-        # Add stimulus process
-        testbench += """
+    def _emit_stimulus(self, entity, write):
+        write("""
     -- Stimulus process
     stim_proc: process
     begin
@@ -141,35 +1743,437 @@ architecture behavior of {tb_name} is
 
         -- Insert stimulus here
         
-        wait;
-    end process;
+""")
+        self._emit_finish(write)
+        write("""    end process;
+""")
+
+def parse_watchdog(text, parser):
+    """Normalize a --watchdog value to a VHDL time literal, or None for 'none'."""
+    if text.lower() == 'none':
+        return None
+    match = _TIME_RE.match(text.strip())
+    if not match:
+        parser.error(f"invalid --watchdog '{text}', expected a time such as '1 ms' or 'none'")
+    return f"{match.group(1)} {match.group(2).lower()}"
+
+def _write_separated(write, items, separator):
+    """Write items from an iterable with separator between consecutive ones."""
+    first = True
+    for item in items:
+        if not first:
+            write(separator)
+        write(item)
+        first = False
 
-end behavior;"""
+def testbench_path_for(input_file_path, entity_name):
+    """Return the testbench output path for an entity of a VHDL source file."""
+    dir_path = os.path.dirname(input_file_path)
+    return os.path.join(dir_path, f"{entity_name}_tb.vhd")
 
-        return testbench
+def file_signature(path):
+    """Return the (mtime, size) pair used to detect untouched sources."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
 
-def process_file(input_file_path):
-    """Process a VHDL file and generate its testbench."""
+# Process umask, needed to give atomically written files normal permissions
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _atomic_write_text(path, text):
+    """Write text to path through a temporary file and an atomic rename.
+
+    Readers never observe a partially written file, and an interrupted
+    write leaves the previous content in place.
+    """
+    dir_path = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-', suffix='.part')
     try:
-        # Read input file
-        with open(input_file_path, 'r') as file:
-            vhdl_content = file.read()
-        
-        # Generate testbench
-        generator = VHDLTestbenchGenerator()
-        generator.parse_vhdl_file(vhdl_content)
-        testbench = generator.generate_testbench()
-        
-        # Create output file path
-        dir_path = os.path.dirname(input_file_path)
-        file_name = os.path.splitext(os.path.basename(input_file_path))[0]
-        output_file_path = os.path.join(dir_path, f"{file_name}_tb.vhd")
-        
-        # Write testbench to file
-        with open(output_file_path, 'w') as file:
-            file.write(testbench)
-            
-        print(f"Testbench generated successfully: {output_file_path}")
+        with os.fdopen(fd, 'w') as file:
+            file.write(text)
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+class AtomicTextWriter:
+    """Text stream that replaces a file atomically, and only if it changed.
+
+    Text is written to a temporary file next to the target while being
+    compared, chunk by chunk, with the current content of the target. On
+    commit an identical result is discarded so the target's mtime is left
+    alone; otherwise the temporary file is renamed over the target. Used as
+    a context manager, an exception discards the temporary file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.written = False
+        dir_path = os.path.dirname(path) or '.'
+        fd, self._tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.tmp-', suffix='.part')
+        self._tmp = os.fdopen(fd, 'w')
+        try:
+            self._existing = open(path, 'r')
+        except OSError:
+            self._existing = None
+
+    def write(self, text):
+        self._tmp.write(text)
+        if self._existing is not None and self._existing.read(len(text)) != text:
+            self._close_existing()
+        return len(text)
+
+    def _close_existing(self):
+        if self._existing is not None:
+            self._existing.close()
+            self._existing = None
+
+    def commit(self):
+        """Finish writing; return True if the target file was replaced."""
+        self._tmp.close()
+        identical = self._existing is not None and self._existing.read(1) == ''
+        self._close_existing()
+        if identical:
+            os.unlink(self._tmp_path)
+            return False
+        try:
+            mode = os.stat(self.path).st_mode & 0o7777
+        except OSError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(self._tmp_path, mode)
+        os.replace(self._tmp_path, self.path)
+        self.written = True
+        return True
+
+    def discard(self):
+        """Abandon the write and leave the target untouched."""
+        self._tmp.close()
+        self._close_existing()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+        return False
+
+def write_if_changed(path, text):
+    """Atomically write text to path unless the file already holds it.
+
+    Returns True when the file was written. An identical file is left
+    untouched so its mtime does not trigger downstream rebuilds.
+    """
+    with AtomicTextWriter(path) as out:
+        out.write(text)
+    return out.written
+
+class BuildCache:
+    """Persistent on-disk record of generated testbenches.
+
+    Each source file maps to its (mtime, size) signature and to the
+    interface key and generated files of every entity it declares: the
+    testbench, followed by its stimulus vector file when there is one. A
+    source whose signature is unchanged and whose generated files all
+    still exist is skipped without being read; a source
+    that changed is re-parsed, but only entities whose interface key
+    changed are rendered and written again. When the cache holds more than
+    max_entries sources the least recently used ones are evicted on save.
+    With path None the cache lives in memory only.
+
+    options_key identifies the generator options in effect (see
+    VHDLTestbenchGenerator.options); sources recorded under other options
+    are never reported fresh.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path, max_entries=DEFAULT_CACHE_ENTRIES, options_key=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.options_key = options_key
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """Read the cache file, starting empty if it is missing or unreadable."""
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == self.VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        """Evict old entries if needed and write the cache atomically."""
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries, key=lambda k: self.entries[k]['used'])
+            for key in by_age[:len(self.entries) - self.max_entries]:
+                del self.entries[key]
+        if self.path is None:
+            return
+        data = {'version': self.VERSION, 'entries': self.entries}
+        _atomic_write_text(self.path, json.dumps(data, separators=(',', ':')))
+
+    @staticmethod
+    def _key(source_path):
+        return os.path.abspath(source_path)
+
+    def is_fresh(self, source_path):
+        """Return True when the source and all its outputs are unchanged."""
+        entry = self.entries.get(self._key(source_path))
+        if entry is None or entry.get('options') != self.options_key:
+            return False
+        try:
+            if file_signature(source_path) != entry['signature']:
+                return False
+        except OSError:
+            return False
+        for record in entry['entities'].values():
+            if not all(os.path.exists(output) for output in record[1:]):
+                return False
+        entry['used'] = time.time()
+        return True
+
+    def outputs(self, source_path):
+        """Return the testbench paths recorded for a source file."""
+        entry = self.entries.get(self._key(source_path), {})
+        return [record[1] for record in entry.get('entities', {}).values()]
+
+    def entity_keys(self, source_path):
+        """Return {entity name: interface key} recorded for a source file."""
+        entry = self.entries.get(self._key(source_path), {})
+        return {name: record[0] for name, record in entry.get('entities', {}).items()}
+
+    def forget(self, source_path):
+        """Drop the record of a source file, e.g. after it was deleted."""
+        self.entries.pop(self._key(source_path), None)
+
+    def update(self, source_path, signature, entities):
+        """Record the signature and {name: [key, output, ...]} of a source file."""
+        self.entries[self._key(source_path)] = {
+            'signature': signature,
+            'entities': entities,
+            'options': self.options_key,
+            'used': time.time(),
+        }
+
+def options_key(options):
+    """Return the BuildCache options_key of VHDLTestbenchGenerator options."""
+    return json.dumps(VHDLTestbenchGenerator(**(options or {})).options(), sort_keys=True)
+
+class FileStats:
+    """Per-file timings, sizes and interface counts for instrumented runs.
+
+    Times are in seconds. read_s covers pulling source chunks from disk,
+    parse_s the lexing and parsing around it, render_s building testbench
+    text and write_s handing it to the output file, including the final
+    compare-and-rename. Byte counts are UTF-8 sizes of the text handled.
+    """
+
+    __slots__ = ('path', 'cached', 'read_s', 'parse_s', 'render_s', 'write_s',
+                 'bytes_read', 'bytes_written', 'entities', 'ports', 'generics')
+
+    def __init__(self, path):
+        self.path = path
+        self.cached = False
+        self.read_s = 0.0
+        self.parse_s = 0.0
+        self.render_s = 0.0
+        self.write_s = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.entities = 0
+        self.ports = 0
+        self.generics = 0
+
+    @property
+    def total_s(self):
+        return self.read_s + self.parse_s + self.render_s + self.write_s
+
+    def timed_chunks(self, chunks):
+        """Wrap a chunk iterator, accounting its time and size as reading."""
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            self.read_s += time.perf_counter() - start
+            if chunk is None:
+                return
+            self.bytes_read += len(chunk.encode('utf-8'))
+            yield chunk
+
+    def as_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['total_s'] = self.total_s
+        return data
+
+class _TimedWriter:
+    """Text stream wrapper that accounts write calls to a FileStats."""
+
+    def __init__(self, stream, stats):
+        self._stream = stream
+        self._stats = stats
+
+    def write(self, text):
+        start = time.perf_counter()
+        self._stream.write(text)
+        self._stats.write_s += time.perf_counter() - start
+        self._stats.bytes_written += len(text.encode('utf-8'))
+        return len(text)
+
+class NoEntityError(ValueError):
+    """Raised when a source file declares no entity, e.g. a package file."""
+
+def generate_file(input_file_path, previous_keys=None, options=None, max_entities=None,
+                  stats=None):
+    """Parse a VHDL file and write one testbench per entity.
+
+    This is a generator yielding (entity name, interface key, output path,
+    written, vector path) as soon as each testbench has been handled,
+    before later entities are parsed; vector path is None unless the entity
+    has a stimulus vector file. Entities whose key matches previous_keys and
+    whose outputs still exist are not rendered again, and outputs whose content is
+    unchanged are not rewritten; both yield written=False. options are
+    passed to VHDLTestbenchGenerator. The source is read in chunks, and
+    with max_entities set reading stops after that many entity headers.
+    When a FileStats is given, per-phase timings are accumulated into it.
+    """
+    previous_keys = previous_keys or {}
+
+    # Read the input incrementally
+    vhdl_content = read_chunks(input_file_path)
+    if stats is not None:
+        vhdl_content = stats.timed_chunks(vhdl_content)
+
+    # Generate one testbench per entity
+    generator = VHDLTestbenchGenerator(**(options or {}))
+    entities = iter_vhdl_entities(vhdl_content, max_entities)
+    found = False
+    while True:
+        if stats is None:
+            entity = next(entities, None)
+        else:
+            start, read_before = time.perf_counter(), stats.read_s
+            entity = next(entities, None)
+            stats.parse_s += time.perf_counter() - start - (stats.read_s - read_before)
+        if entity is None:
+            break
+
+        found = True
+        key = generator.interface_key(entity)
+        output_file_path = testbench_path_for(input_file_path, entity.name)
+        if stats is not None:
+            stats.entities += 1
+            stats.ports += len(entity.ports)
+            stats.generics += len(entity.generics)
+        # Only entities with inputs to drive get a vector file. The settings
+        # are checked before the testbench that reads it is replaced.
+        vector_file_path = None
+        if generator.stimulus is not None and check_stimulus(
+                entity, generator.stimulus, generator.resolver, generator.golden_model(entity)):
+            vector_file_path = vector_path_for(input_file_path, entity.name)
+        if (previous_keys.get(entity.name) == key and os.path.exists(output_file_path)
+                and (vector_file_path is None or os.path.exists(vector_file_path))):
+            yield entity.name, key, output_file_path, False, vector_file_path
+            continue
+
+        # Stream the testbench into its file
+        if stats is None:
+            with AtomicTextWriter(output_file_path) as out:
+                generator.emit_testbench(entity, out)
+        else:
+            # Rendering is the emit span minus the write calls nested in it;
+            # opening the file and the final compare-and-rename are writing
+            start = time.perf_counter()
+            with AtomicTextWriter(output_file_path) as out:
+                opened, write_before = time.perf_counter(), stats.write_s
+                generator.emit_testbench(entity, _TimedWriter(out, stats))
+                emitted = time.perf_counter()
+                stats.render_s += emitted - opened - (stats.write_s - write_before)
+            stats.write_s += (opened - start) + (time.perf_counter() - emitted)
+        written = out.written
+
+        # Stimulus vectors go to a file next to the testbench
+        if vector_file_path is not None:
+            start = time.perf_counter()
+            if write_vector_file(vector_file_path, entity, generator.stimulus,
+                                 generator.resolver, generator.golden_model(entity)):
+                written = True
+            if stats is not None:
+                stats.write_s += time.perf_counter() - start
+        yield entity.name, key, output_file_path, written, vector_file_path
+
+    if not found:
+        raise NoEntityError("no entity declaration found")
+
+def emit_file(input_file_path, stream, options=None, max_entities=None):
+    """Write the testbenches of every entity in a file to one text stream."""
+    generator = VHDLTestbenchGenerator(**(options or {}))
+    found = False
+    chunks = read_chunks(input_file_path)
+    for entity in iter_vhdl_entities(chunks, max_entities):
+        if found:
+            stream.write("\n\n")
+        found = True
+        generator.emit_testbench(entity, stream)
+    if not found:
+        raise NoEntityError("no entity declaration found")
+    stream.write("\n")
+
+def _cache_record(key, output_file_path, vector_file_path):
+    """Return the BuildCache record of one entity's generated files."""
+    record = [key, output_file_path]
+    if vector_file_path is not None:
+        record.append(vector_file_path)
+    return record
+
+def process_file(input_file_path, cache=None, options=None, max_entities=None, stats=None):
+    """Process a VHDL file and generate a testbench for each entity.
+
+    A file without an entity is reported as skipped and counts as success,
+    as in process_batch. When a FileStats is given it is filled in with
+    the file's timings.
+    """
+    try:
+        if cache is not None and cache.is_fresh(input_file_path):
+            if stats is not None:
+                stats.cached = True
+            outputs = cache.outputs(input_file_path)
+            if not outputs:
+                print(f"No entity declaration, skipped: {input_file_path}")
+            for output_file_path in outputs:
+                print(f"Testbench up to date: {output_file_path}")
+            return True
+
+        signature = file_signature(input_file_path)
+        previous_keys = cache.entity_keys(input_file_path) if cache is not None else None
+        entities = {}
+        outputs = generate_file(input_file_path, previous_keys, options, max_entities, stats)
+        try:
+            for name, key, output_file_path, written, vector_file_path in outputs:
+                entities[name] = _cache_record(key, output_file_path, vector_file_path)
+                if written:
+                    print(f"Testbench generated successfully: {output_file_path}")
+                else:
+                    print(f"Testbench up to date: {output_file_path}")
+        except NoEntityError:
+            print(f"No entity declaration, skipped: {input_file_path}")
+        if cache is not None:
+            cache.update(input_file_path, signature, entities)
         return True
         
     except FileNotFoundError:
@@ -179,13 +2183,1570 @@ def process_file(input_file_path):
         print(f"Error generating testbench: {str(e)}")
         return False
 
+def is_testbench_file(path):
+    """Return True for files that look like generated testbenches."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return stem.lower().endswith('_tb')
+
+def collect_vhdl_files(inputs):
+    """Expand files, directories and glob patterns into VHDL source paths.
+
+    Returns a tuple (files, unmatched) where files is a sorted list without
+    duplicates and unmatched lists the inputs that did not match anything.
+    Generated testbenches are skipped when scanning directories and globs.
+    """
+    files = set()
+    unmatched = []
+    for item in inputs:
+        if os.path.isfile(item):
+            files.add(os.path.normpath(item))
+            continue
+
+        if os.path.isdir(item):
+            candidates = []
+            for dir_path, dir_names, file_names in os.walk(item):
+                dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+                candidates.extend(os.path.join(dir_path, f) for f in file_names)
+        else:
+            candidates = glob.glob(item, recursive=True)
+
+        found = False
+        for path in candidates:
+            if (os.path.isfile(path)
+                    and path.lower().endswith(VHDL_EXTENSIONS)
+                    and not is_testbench_file(path)):
+                files.add(os.path.normpath(path))
+                found = True
+        if not found:
+            unmatched.append(item)
+
+    return sorted(files), unmatched
+
+class FileResult:
+    """Outcome of generating the testbenches for one source file."""
+
+    __slots__ = ('path', 'ok', 'skipped', 'error', 'written', 'unchanged', 'signature',
+                 'entities', 'stats')
+
+    def __init__(self, path):
+        self.path = path
+        self.stats = None
+        self.ok = False
+        self.skipped = False
+        self.error = None
+        self.written = []
+        self.unchanged = []
+        self.signature = None
+        self.entities = {}
+
+def _batch_worker(input_file_path, previous_keys=None, options=None, max_entities=None,
+                  collect_stats=False):
+    """Generate the testbenches of one file and return a FileResult."""
+    result = FileResult(input_file_path)
+    if collect_stats:
+        result.stats = FileStats(input_file_path)
+    try:
+        result.signature = file_signature(input_file_path)
+        outputs = generate_file(input_file_path, previous_keys, options, max_entities,
+                                result.stats)
+        for name, key, output, written, vector in outputs:
+            result.entities[name] = _cache_record(key, output, vector)
+            (result.written if written else result.unchanged).append(output)
+        result.ok = True
+    except NoEntityError:
+        # Packages, configurations and the like have nothing to test
+        result.ok = True
+        result.skipped = True
+    except FileNotFoundError:
+        result.error = "input file not found"
+    except Exception as e:
+        result.error = str(e)
+    return result
+
+def process_batch(input_files, jobs=None, cache=None, options=None, max_entities=None,
+                  collect_stats=False, stats_stream=None):
+    """Generate testbenches for many files, in parallel when jobs > 1.
+
+    Sources that the cache reports as fresh are skipped without being
+    submitted to a worker. Sources without an entity are reported as
+    skipped, not failed, and are cached like any other source. Prints one
+    line per file as it completes and
+    returns a list of FileResult objects in input order. With collect_stats
+    every result carries a FileStats, which is also written as a JSON line
+    to stats_stream as soon as the file completes.
+    """
+    results = {}
+
+    def report(result):
+        results[result.path] = result
+        if result.stats is not None and stats_stream is not None:
+            write_stats_line(stats_stream, result.stats)
+        if not result.ok:
+            print(f"Error generating testbench for '{result.path}': {result.error}")
+            return
+        if result.skipped:
+            print(f"No entity declaration, skipped: {result.path}")
+        for output in result.written:
+            print(f"Testbench generated successfully: {output}")
+        for output in result.unchanged:
+            print(f"Testbench up to date: {output}")
+        if cache is not None and result.signature is not None:
+            cache.update(result.path, result.signature, result.entities)
+
+    pending = []
+    for path in input_files:
+        if cache is not None and cache.is_fresh(path):
+            result = FileResult(path)
+            result.ok = True
+            result.unchanged = cache.outputs(path)
+            result.skipped = not result.unchanged
+            if collect_stats:
+                result.stats = FileStats(path)
+                result.stats.cached = True
+            report(result)
+        else:
+            pending.append(path)
+
+    def previous_keys(path):
+        return cache.entity_keys(path) if cache is not None else None
+
+    if jobs == 1 or len(pending) < 2:
+        for path in pending:
+            report(_batch_worker(path, previous_keys(path), options, max_entities,
+                                 collect_stats))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_batch_worker, path, previous_keys(path),
+                                       options, max_entities, collect_stats)
+                       for path in pending]
+            for future in as_completed(futures):
+                report(future.result())
+
+    return [results[path] for path in input_files]
+
+def print_summary(results, unmatched=()):
+    """Print a per-file success/failure summary."""
+    failed = [r for r in results if not r.ok]
+    skipped = sum(1 for r in results if r.skipped)
+    written = sum(len(r.written) for r in results)
+    unchanged = sum(len(r.unchanged) for r in results)
+    print()
+    print(f"Summary: {len(results) - len(failed) - skipped} succeeded, {skipped} skipped, "
+          f"{len(failed)} failed ({written} testbenches written, {unchanged} up to date)")
+    for result in failed:
+        print(f"  FAILED {result.path}: {result.error}")
+    for item in unmatched:
+        print(f"  NO MATCH {item}")
+
+def _is_vhdl_source(path):
+    """Return True for VHDL sources that testbenches are generated for."""
+    return path.lower().endswith(VHDL_EXTENSIONS) and not is_testbench_file(path)
+
+class PollingWatcher:
+    """Detect changed VHDL sources by comparing periodic stat snapshots.
+
+    Used where inotify is not available. Each poll costs one stat per
+    source, which is still far cheaper than re-parsing the tree.
+    """
+
+    def __init__(self, directories, files, interval=1.0):
+        self.directories = directories
+        self.files = files
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        paths = list(self.files)
+        for directory in self.directories:
+            for dir_path, dir_names, file_names in os.walk(directory):
+                dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+                paths.extend(os.path.join(dir_path, f) for f in file_names)
+        for path in paths:
+            if _is_vhdl_source(path):
+                try:
+                    snapshot[os.path.normpath(path)] = file_signature(path)
+                except OSError:
+                    pass
+        return snapshot
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of changed paths."""
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {path for path, sig in current.items() if self.snapshot.get(path) != sig}
+        changed.update(path for path in self.snapshot if path not in current)
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """Detect changed VHDL sources with Linux inotify, watching directories recursively.
+
+    Events are read without polling the file system, so an idle tree costs
+    nothing. New subdirectories are picked up as they appear. On a queue
+    overflow every watched source is reported as changed.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self, directories, files):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or libc_name is None:
+            raise OSError("inotify is not available on this platform")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not available in this C library")
+        self.fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        self.files = {os.path.normpath(f) for f in files}
+        self._tree_roots = [os.path.normpath(d) for d in directories]
+        for directory in directories:
+            self._add_tree(directory)
+        for directory in {os.path.dirname(f) or '.' for f in self.files}:
+            self._add_watch(directory)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+
+    def _add_tree(self, directory):
+        """Watch a directory and its subdirectories; return the sources found."""
+        found = set()
+        for dir_path, dir_names, file_names in os.walk(directory):
+            dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+            self._add_watch(dir_path)
+            found.update(os.path.normpath(os.path.join(dir_path, f))
+                         for f in file_names if _is_vhdl_source(f))
+        return found
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the set of changed paths."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                changed.update(self._all_sources())
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.normpath(os.path.join(directory, name))
+            if mask & self.IN_ISDIR:
+                if (mask & (self.IN_CREATE | self.IN_MOVED_TO) and not name.startswith('.')
+                        and self._in_tree(path)):
+                    changed.update(self._add_tree(path))
+                continue
+            if self._is_watched_source(path):
+                changed.add(path)
+        return changed
+
+    def _is_watched_source(self, path):
+        if not _is_vhdl_source(path):
+            return False
+        # Directories watched only for explicitly listed files report nothing else
+        return path in self.files or self._in_tree(os.path.dirname(path) or '.')
+
+    def _in_tree(self, directory):
+        return any(directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)
+                   for root in self._tree_roots)
+
+    def _all_sources(self):
+        sources = set(self.files)
+        for root in self._tree_roots:
+            for dir_path, dir_names, file_names in os.walk(root):
+                dir_names[:] = [d for d in dir_names if not d.startswith('.')]
+                sources.update(os.path.normpath(os.path.join(dir_path, f))
+                               for f in file_names if _is_vhdl_source(f))
+        return sources
+
+    def close(self):
+        os.close(self.fd)
+
+def default_watch_cache(inputs):
+    """Return the build cache path --watch uses without --cache.
+
+    The cache sits in the first input directory, next to the first input
+    file, or in the working directory when the first input is a pattern.
+    """
+    first = inputs[0]
+    if os.path.isdir(first):
+        return os.path.join(first, DEFAULT_WATCH_CACHE)
+    if os.path.isfile(first):
+        return os.path.join(os.path.dirname(first), DEFAULT_WATCH_CACHE)
+    return DEFAULT_WATCH_CACHE
+
+def _declares_package(path):
+    """Return True when a source file declares a package."""
+    try:
+        with open(path, 'r', errors='replace') as file:
+            return _PACKAGE_DECLARATION_RE.search(file.read()) is not None
+    except OSError:
+        return False
+
+def watch(inputs, cache, options=None, max_entities=None, jobs=None, debounce=0.3,
+          poll_interval=None, resolver_factory=None):
+    """Regenerate testbenches whenever VHDL sources under inputs change.
+
+    Directories are watched recursively and files individually; glob
+    patterns are expanded once at start-up. Bursts of events are collected
+    until the tree has been quiet for debounce seconds and then handled as
+    one batch through the build cache, so only entities whose interface
+    changed get a new testbench. inotify is used on Linux; poll_interval
+    forces (or, elsewhere, selects) stat polling instead. Runs until
+    interrupted.
+
+    With resolver_factory, a callable returning a new ConstantResolver, a
+    change to a file declaring a package (or a deleted source) rebuilds the
+    resolver and the cache options key, and every source is run through
+    the cache again, so testbenches follow the new constants.
+    """
+    directories = [os.path.normpath(i) for i in inputs if os.path.isdir(i)]
+    files = [os.path.normpath(i) for i in inputs if os.path.isfile(i)]
+    for pattern in (i for i in inputs if not os.path.exists(i)):
+        files.extend(collect_vhdl_files([pattern])[0])
+
+    watcher = None
+    if poll_interval is None:
+        try:
+            watcher = InotifyWatcher(directories, files)
+        except OSError:
+            poll_interval = 1.0
+    if watcher is None:
+        watcher = PollingWatcher(directories, files, poll_interval)
+    print(f"Watching {len(directories)} directories and {len(files)} files "
+          f"with {type(watcher).__name__} (Ctrl+C to stop)")
+
+    try:
+        while True:
+            changed = watcher.poll(3600)
+            if not changed:
+                continue
+            # Debounce: keep collecting until no event arrives for a while
+            while True:
+                more = watcher.poll(debounce)
+                if not more:
+                    break
+                changed |= more
+
+            existing = sorted(path for path in changed if os.path.isfile(path))
+            deleted = changed.difference(existing)
+            for path in deleted:
+                cache.forget(path)
+            if resolver_factory is not None and (
+                    deleted or any(_declares_package(path) for path in existing)):
+                options['resolver'] = resolver_factory()
+                cache.options_key = options_key(options)
+                existing = collect_vhdl_files(directories + files)[0]
+                print("Packages changed, regenerating with the new constants")
+            if existing:
+                process_batch(existing, jobs=jobs, cache=cache, options=options,
+                              max_entities=max_entities)
+                cache.save()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        watcher.close()
+        cache.save()
+
+def write_stats_line(stream, stats):
+    """Write one FileStats record as a JSON line."""
+    stream.write(json.dumps(stats.as_dict(), sort_keys=True) + "\n")
+    stream.flush()
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def print_stats_summary(all_stats, top=10):
+    """Print p50/p95/max per phase and the slowest files."""
+    measured = [s for s in all_stats if not s.cached]
+    print()
+    print(f"Timing summary: {len(measured)} files measured, "
+          f"{len(all_stats) - len(measured)} skipped by the cache")
+    if not measured:
+        return
+    print(f"  {'phase':<8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'total ms':>11}")
+    for phase in ('read_s', 'parse_s', 'render_s', 'write_s', 'total_s'):
+        values = sorted(getattr(s, phase) for s in measured)
+        print(f"  {phase[:-2]:<8} {_percentile(values, 0.5) * 1000:10.2f} "
+              f"{_percentile(values, 0.95) * 1000:10.2f} {values[-1] * 1000:10.2f} "
+              f"{sum(values) * 1000:11.2f}")
+    total_read = sum(s.bytes_read for s in measured)
+    total_written = sum(s.bytes_written for s in measured)
+    print(f"  {total_read} bytes read, {total_written} bytes rendered")
+    print("  Slowest files:")
+    for stats in sorted(measured, key=lambda s: s.total_s, reverse=True)[:top]:
+        print(f"    {stats.total_s * 1000:9.2f} ms  {stats.path} "
+              f"({stats.ports} ports, {stats.generics} generics, "
+              f"{stats.bytes_read} bytes)")
+
+# Default file of the persistent project index
+DEFAULT_INDEX = '.tbgen-index.sqlite'
+
+_INDEX_SCHEMA = """
+CREATE TABLE files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE entities (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_lc TEXT NOT NULL
+);
+CREATE TABLE generics (
+    entity_id INTEGER NOT NULL REFERENCES entities(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL,
+    default_value TEXT
+);
+CREATE TABLE ports (
+    entity_id INTEGER NOT NULL REFERENCES entities(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    type TEXT NOT NULL,
+    type_lc TEXT NOT NULL,
+    base_type_lc TEXT NOT NULL
+);
+CREATE TABLE packages (
+    id INTEGER PRIMARY KEY,
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_lc TEXT NOT NULL
+);
+CREATE TABLE constants (
+    package_id INTEGER NOT NULL REFERENCES packages(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_lc TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX entities_name ON entities(name_lc);
+CREATE INDEX entities_file ON entities(file_id);
+CREATE INDEX generics_entity ON generics(entity_id);
+CREATE INDEX ports_entity ON ports(entity_id);
+CREATE INDEX ports_type ON ports(type_lc);
+CREATE INDEX ports_base_type ON ports(base_type_lc);
+CREATE INDEX packages_name ON packages(name_lc);
+CREATE INDEX packages_file ON packages(file_id);
+CREATE INDEX constants_package ON constants(package_id);
+CREATE INDEX constants_name ON constants(name_lc);
+"""
+
+def _base_type(type_text):
+    """Return the type mark of a subtype indication, without constraints."""
+    return re.split(r'[\s(]', type_text, 1)[0].lower()
+
+def _index_worker(path, known_digest=None):
+    """Read, hash and parse one source for the project index.
+
+    Returns (path, signature, digest, units, error). units is None when
+    the digest equals known_digest, so unchanged content is not parsed.
+    """
+    try:
+        signature = file_signature(path)
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError as e:
+        return path, None, None, None, str(e)
+    digest = hashlib.sha256(data).hexdigest()
+    if digest == known_digest:
+        return path, signature, digest, None, None
+    try:
+        units = list(iter_design_units(data.decode('utf-8', errors='replace')))
+    except Exception as e:
+        return path, signature, digest, [], str(e)
+    return path, signature, digest, units, None
+
+class ProjectIndex:
+    """Persistent SQLite index of the entities and packages of a project.
+
+    Every source file is recorded with its (mtime, size) signature and
+    content hash, together with its entities (generics and ports) and its
+    packages (constants). update() only re-reads files whose signature
+    changed and only re-parses files whose hash changed, so refreshing a
+    large, mostly unchanged tree costs one stat per file. Lookups are
+    indexed queries and never touch the sources.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            self._create()
+
+    def _create(self):
+        """Drop whatever an older version stored and create the schema."""
+        with self.db:
+            tables = [row[0] for row in self.db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            self.db.execute("PRAGMA foreign_keys = OFF")
+            for table in tables:
+                self.db.execute(f"DROP TABLE IF EXISTS {table}")
+            self.db.execute("PRAGMA foreign_keys = ON")
+            self.db.executescript(_INDEX_SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {self.VERSION}")
+
+    def close(self):
+        self.db.close()
+
+    def update(self, paths, jobs=None, prune=True):
+        """Bring the index in line with the given source files.
+
+        With prune set, files in the index that are not among paths are
+        removed. Returns a dict counting added, updated, unchanged, removed
+        and failed files.
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        known = {row[0]: row[1:] for row in self.db.execute(
+            "SELECT path, id, mtime_ns, size, sha256 FROM files")}
+        counts = dict.fromkeys(('added', 'updated', 'unchanged', 'removed', 'failed'), 0)
+
+        stale = []
+        for path in paths:
+            row = known.get(path)
+            try:
+                signature = file_signature(path)
+            except OSError:
+                signature = None
+            if row is not None and signature == [row[1], row[2]]:
+                counts['unchanged'] += 1
+            else:
+                stale.append(path)
+
+        digests = [known[p][3] if p in known else None for p in stale]
+        if jobs == 1 or len(stale) < 2:
+            parsed = map(_index_worker, stale, digests)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=jobs)
+            parsed = executor.map(_index_worker, stale, digests, chunksize=16)
+
+        try:
+            with self.db:
+                for path, signature, digest, units, error in parsed:
+                    row = known.get(path)
+                    if signature is None:
+                        # Vanished or unreadable: drop it from the index
+                        if row is not None:
+                            self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                        counts['failed'] += 1
+                        print(f"Error indexing '{path}': {error}")
+                        continue
+                    if units is None:
+                        self.db.execute("UPDATE files SET mtime_ns = ?, size = ? WHERE id = ?",
+                                        (signature[0], signature[1], row[0]))
+                        counts['unchanged'] += 1
+                        continue
+                    if row is not None:
+                        self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                    self._insert_file(path, signature, digest, units, error)
+                    if error is not None:
+                        counts['failed'] += 1
+                        print(f"Error indexing '{path}': {error}")
+                    counts['updated' if row is not None else 'added'] += 1
+
+                if prune:
+                    wanted = set(paths)
+                    for path, row in known.items():
+                        if path not in wanted:
+                            self.db.execute("DELETE FROM files WHERE id = ?", (row[0],))
+                            counts['removed'] += 1
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return counts
+
+    def _insert_file(self, path, signature, digest, units, error):
+        """Store one parsed file with all of its design units."""
+        file_id = self.db.execute(
+            "INSERT INTO files (path, mtime_ns, size, sha256, error) VALUES (?, ?, ?, ?, ?)",
+            (path, signature[0], signature[1], digest, error)).lastrowid
+        for position, unit in enumerate(units):
+            if isinstance(unit, Package):
+                package_id = self.db.execute(
+                    "INSERT INTO packages (file_id, position, name, name_lc) VALUES (?, ?, ?, ?)",
+                    (file_id, position, unit.name, unit.name.lower())).lastrowid
+                self.db.executemany(
+                    "INSERT INTO constants VALUES (?, ?, ?, ?, ?, ?)",
+                    [(package_id, i, c.name, c.name.lower(), c.type, c.value)
+                     for i, c in enumerate(unit.constants)])
+                continue
+            entity_id = self.db.execute(
+                "INSERT INTO entities (file_id, position, name, name_lc) VALUES (?, ?, ?, ?)",
+                (file_id, position, unit.name, unit.name.lower())).lastrowid
+            self.db.executemany(
+                "INSERT INTO generics VALUES (?, ?, ?, ?, ?)",
+                [(entity_id, i, g.name, g.type, g.default) for i, g in enumerate(unit.generics)])
+            self.db.executemany(
+                "INSERT INTO ports VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(entity_id, i, p.name, p.direction, p.type, p.type.lower(), _base_type(p.type))
+                 for i, p in enumerate(unit.ports)])
+
+    def _entity(self, entity_id, name):
+        """Rebuild an Entity record from its rows."""
+        generics = tuple(Generic(*row) for row in self.db.execute(
+            "SELECT name, type, default_value FROM generics WHERE entity_id = ? "
+            "ORDER BY position", (entity_id,)))
+        ports = tuple(Port(*row) for row in self.db.execute(
+            "SELECT name, direction, type FROM ports WHERE entity_id = ? "
+            "ORDER BY position", (entity_id,)))
+        return Entity(name, generics, ports)
+
+    def _entities(self, query, parameters):
+        """Run a query selecting (entity id, name, path) and return (path, Entity) pairs."""
+        return [(path, self._entity(entity_id, name))
+                for entity_id, name, path in self.db.execute(query, parameters).fetchall()]
+
+    def find_entity(self, name):
+        """Return (path, Entity) for every entity called name, case-insensitively."""
+        return self._entities(
+            "SELECT e.id, e.name, f.path FROM entities e JOIN files f ON f.id = e.file_id "
+            "WHERE e.name_lc = ? ORDER BY f.path, e.position", (name.lower(),))
+
+    def entities_with_port_type(self, type_text):
+        """Return (path, Entity) for entities with a port of the given type.
+
+        type_text matches either a whole subtype indication or its type mark,
+        so 'std_logic_vector' finds 'std_logic_vector(7 downto 0)' as well.
+        """
+        type_lc = ' '.join(type_text.split()).lower()
+        return self._entities(
+            "SELECT DISTINCT e.id, e.name, f.path FROM ports p "
+            "JOIN entities e ON e.id = p.entity_id JOIN files f ON f.id = e.file_id "
+            "WHERE p.type_lc = ? OR p.base_type_lc = ? ORDER BY f.path, e.position",
+            (type_lc, type_lc))
+
+    def find_package(self, name):
+        """Return the paths of the files declaring package name."""
+        return [row[0] for row in self.db.execute(
+            "SELECT f.path FROM packages k JOIN files f ON f.id = k.file_id "
+            "WHERE k.name_lc = ? ORDER BY f.path", (name.lower(),))]
+
+    def find_constant(self, name, package=None):
+        """Return (package, Constant, path) for constants called name.
+
+        With package given, only that package's constants are searched.
+        """
+        query = ("SELECT k.name, c.name, c.type, c.value, f.path FROM constants c "
+                 "JOIN packages k ON k.id = c.package_id JOIN files f ON f.id = k.file_id "
+                 "WHERE c.name_lc = ?")
+        parameters = [name.lower()]
+        if package is not None:
+            query += " AND k.name_lc = ?"
+            parameters.append(package.lower())
+        return [(row[0], Constant(*row[1:4]), row[4])
+                for row in self.db.execute(query + " ORDER BY f.path, c.position", parameters)]
+
+    def stale_paths(self, paths):
+        """Return the paths whose signature no longer matches the index."""
+        stale = []
+        for path in paths:
+            row = self.db.execute("SELECT mtime_ns, size FROM files WHERE path = ?",
+                                  (os.path.abspath(path),)).fetchone()
+            try:
+                fresh = row is not None and file_signature(path) == list(row)
+            except OSError:
+                fresh = False
+            if not fresh:
+                stale.append(path)
+        return stale
+
+def generate_from_index(matches, options=None):
+    """Write testbenches for (path, Entity) pairs taken from the index.
+
+    The sources are not read again. Returns True when every testbench
+    was handled without errors.
+    """
+    generator = VHDLTestbenchGenerator(**(options or {}))
+    ok = True
+    for path, entity in matches:
+        output_file_path = testbench_path_for(path, entity.name)
+        try:
+            with AtomicTextWriter(output_file_path) as out:
+                generator.emit_testbench(entity, out)
+        except Exception as e:
+            print(f"Error generating testbench for '{entity.name}' in '{path}': {e}")
+            ok = False
+            continue
+        if out.written:
+            print(f"Testbench generated successfully: {output_file_path}")
+        else:
+            print(f"Testbench up to date: {output_file_path}")
+    return ok
+
+# Generic sweeps
+
+# Longest readable suffix of a sweep testbench name before a digest is used
+MAX_SWEEP_SLUG = 40
+
+# Sweep manifest written next to the outputs unless --sweep-manifest says otherwise
+DEFAULT_SWEEP_MANIFEST = 'sweep-manifest.json'
+
+def parse_sweep(text):
+    """Parse GENERIC=V1,V2,LOW:HIGH[:STEP] into (generic name, list of value texts).
+
+    Integer ranges include both bounds; other items are used verbatim, so
+    values containing commas cannot be swept from the command line.
+    """
+    name, separator, values_text = text.partition('=')
+    name = name.strip()
+    if not separator or not re.match(r'[A-Za-z]\w*$', name):
+        raise ValueError(f"invalid sweep '{text}', expected GENERIC=VALUES")
+    values = []
+    for item in values_text.split(','):
+        item = item.strip()
+        match = re.match(r'(-?\d+):(-?\d+)(?::(\d+))?$', item)
+        if match:
+            low, high = int(match.group(1)), int(match.group(2))
+            step = int(match.group(3) or 1)
+            if step < 1 or low > high:
+                raise ValueError(f"invalid range '{item}' in sweep of {name}")
+            values.extend(str(value) for value in range(low, high + 1, step))
+        elif item:
+            values.append(item)
+    if not values:
+        raise ValueError(f"sweep of {name} has no values")
+    return name, values
+
+def _sweep_slug(assignment, digest=False):
+    """Return the identifier suffix naming one generic assignment.
+
+    The suffix spells out the values unless that is too long or digest is
+    set, in which case a short hash of the assignment is used.
+    """
+    parts = []
+    for name, value in assignment:
+        parts.append(name.lower() + re.sub(r'[^a-z0-9]+', '_', value.lower()).strip('_'))
+    slug = re.sub(r'_+', '_', '_'.join(parts))
+    if digest or not slug or len(slug) > MAX_SWEEP_SLUG:
+        slug = "g" + hashlib.sha1(repr(assignment).encode('utf-8')).hexdigest()[:8]
+    return slug
+
+def sweep_configurations(entity, sweeps, resolver=None):
+    """Return the distinct generic assignments of an entity for a sweep.
+
+    sweeps maps lower-case generic names to value lists; generics the
+    entity does not have are ignored. Values are normalized by evaluating
+    them against the package constants where possible, so '8' and '2*4'
+    are the same configuration. Each assignment is a tuple of (generic
+    name, value) pairs in declaration order.
+    """
+    resolver = resolver or ConstantResolver()
+    swept = [g for g in entity.generics if g.name.lower() in sweeps]
+    if not swept:
+        return []
+
+    choices = []
+    for generic in swept:
+        normalized = []
+        for value in sweeps[generic.name.lower()]:
+            number = resolver.evaluate(value, entity.generics)
+            text = str(number) if number is not None else value
+            if text not in normalized:
+                normalized.append(text)
+        choices.append([(generic.name, text) for text in normalized])
+    return [tuple(combination) for combination in itertools.product(*choices)]
+
+def _sweep_worker(input_file_path, entity, assignment, name, options=None):
+    """Write the testbench of one sweep configuration and return its manifest entry."""
+    options = dict(options or {})
+    # Signal widths depend on the swept generics, which the testbench cannot see
+    if options.get('resolver') is None:
+        options['resolver'] = ConstantResolver()
+    generator = VHDLTestbenchGenerator(**options)
+    values = dict(assignment)
+    swept = entity._replace(generics=[g._replace(default=values.get(g.name, g.default))
+                                      for g in entity.generics])
+    entry = {'entity': entity.name, 'source': input_file_path, 'unit': f"{name}_tb",
+             'generics': values, 'testbench': testbench_path_for(input_file_path, name),
+             'vectors': None, 'written': False, 'error': None}
+    try:
+        if generator.stimulus is not None:
+            check_stimulus(swept, generator.stimulus, generator.resolver,
+                           generator.golden_model(swept))
+        with AtomicTextWriter(entry['testbench']) as out:
+            generator.emit_testbench(swept, out, name=name)
+        entry['written'] = out.written
+        if generator.stimulus is not None:
+            vector_file_path = vector_path_for(input_file_path, name)
+            if write_vector_file(vector_file_path, swept, generator.stimulus,
+                                 generator.resolver, generator.golden_model(swept)):
+                entry['written'] = True
+            if os.path.exists(vector_file_path):
+                entry['vectors'] = vector_file_path
+    except Exception as e:
+        entry['error'] = str(e)
+    return entry
+
+def process_sweep(input_files, sweeps, jobs=None, options=None, manifest_path=None):
+    """Generate one testbench per distinct generic configuration of every entity.
+
+    Entities without any of the swept generics are skipped. Testbenches
+    are named <entity>_<slug>_tb, where the slug spells out the generic
+    values. They are generated in parallel, and a JSON manifest lists
+    every run with its unit, files and generic values. Returns True if
+    everything succeeded.
+    """
+    options = options or {}
+    resolver = options.get('resolver') or ConstantResolver()
+    tasks = []
+    used = set()
+    ok = True
+    for path in input_files:
+        try:
+            entities = list(iter_vhdl_entities(read_chunks(path)))
+        except Exception as e:
+            print(f"Error reading '{path}': {e}")
+            ok = False
+            continue
+        for entity in entities:
+            configurations = sweep_configurations(entity, sweeps, resolver)
+            if not configurations:
+                print(f"Skipping {entity.name}: none of the swept generics")
+            for assignment in configurations:
+                name = f"{entity.name}_{_sweep_slug(assignment)}"
+                testbench = testbench_path_for(path, name)
+                if testbench in used:
+                    # Different values that read the same once turned into a name
+                    name = f"{entity.name}_{_sweep_slug(assignment, digest=True)}"
+                    testbench = testbench_path_for(path, name)
+                used.add(testbench)
+                tasks.append((path, entity, assignment, name))
+
+    entries = []
+
+    def report(entry):
+        entries.append(entry)
+        if entry['error'] is not None:
+            print(f"Error generating testbench '{entry['testbench']}': {entry['error']}")
+        elif entry['written']:
+            print(f"Testbench generated successfully: {entry['testbench']}")
+        else:
+            print(f"Testbench up to date: {entry['testbench']}")
+
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            report(_sweep_worker(*task, options))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = [executor.submit(_sweep_worker, *task, options) for task in tasks]
+            for future in as_completed(futures):
+                report(future.result())
+
+    entries.sort(key=lambda entry: entry['testbench'])
+    manifest = {'template': TEMPLATE_VERSION, 'runs': [
+        {key: entry[key] for key in ('entity', 'source', 'unit', 'generics',
+                                     'testbench', 'vectors')}
+        for entry in entries if entry['error'] is None]}
+    if manifest_path is not None:
+        _atomic_write_text(manifest_path, json.dumps(manifest, indent=2) + "\n")
+        print(f"Sweep manifest with {len(manifest['runs'])} runs: {manifest_path}")
+    return ok and all(entry['error'] is None for entry in entries)
+
+# Simulator runs
+
+# Shared work library directory of the 'run' subcommand
+DEFAULT_WORKDIR = '.tbgen-work'
+
+# Units a file declares and the work library units it refers to
+_DECLARED_UNIT_RE = re.compile(r'^\s*(package|entity)\s+(?!body\b)(\w+)\s+is\b',
+                               re.IGNORECASE | re.MULTILINE)
+_WORK_REFERENCE_RE = re.compile(r'\bwork\.(\w+)', re.IGNORECASE)
+
+# Simulator output that fails a run even when the exit status is 0
+DEFAULT_FAIL_PATTERN = r'\((?:report|assertion) (?:error|failure)\)'
+
+class RunResult(namedtuple('RunResult', 'unit path passed status wall_s log_path')):
+    """Outcome of one testbench run; status is 'pass', 'fail', 'timeout' or 'error'."""
+    __slots__ = ()
+
+def _strip_comments(text):
+    """Remove VHDL line comments so declarations in comments are not matched."""
+    return re.sub(r'--[^\n]*', '', text)
+
+def analysis_order(paths, testbenches=()):
+    """Order source files so every file comes after the files it depends on.
+
+    A file depends on the files declaring the work library units it names
+    (work.pkg or entity work.name). Without dependencies, packages come
+    first, then other sources, then testbenches. Returns (ordered paths,
+    {path: set of dependency paths}).
+    """
+    testbenches = set(testbenches)
+    declared = {}
+    references = {}
+    has_package = set()
+    for path in paths:
+        with open(path, 'r', errors='replace') as file:
+            text = _strip_comments(file.read())
+        for kind, name in _DECLARED_UNIT_RE.findall(text):
+            declared.setdefault(name.lower(), path)
+            if kind.lower() == 'package':
+                has_package.add(path)
+        references[path] = {name.lower() for name in _WORK_REFERENCE_RE.findall(text)}
+
+    dependencies = {}
+    for path in paths:
+        dependencies[path] = {declared[name] for name in references[path]
+                              if name in declared and declared[name] != path}
+
+    def rank(path):
+        if path in testbenches:
+            return 2
+        return 0 if path in has_package else 1
+
+    ordered = []
+    visited = set()
+
+    def visit(path):
+        # Depth first; a dependency cycle is broken where it is met again
+        if path in visited:
+            return
+        visited.add(path)
+        for dependency in sorted(dependencies[path], key=lambda p: (rank(p), p)):
+            visit(dependency)
+        ordered.append(path)
+
+    for path in sorted(paths, key=lambda p: (rank(p), p)):
+        visit(path)
+    return ordered, dependencies
+
+class SimulationRunner:
+    """Analyze sources into a shared work library and run testbenches in parallel.
+
+    The simulator is called like GHDL, so any command following the same
+    conventions (a wrapper script or a fake simulator) can stand in:
+
+        SIMULATOR -a --workdir=DIR --std=STD FILE
+        SIMULATOR --elab-run --workdir=DIR --std=STD UNIT [RUN_ARGS...]
+
+    Runs happen in the directory of the testbench file, so relative
+    VECTOR_FILE defaults resolve next to it. The sha256 of every analyzed
+    file is kept in the work directory, and a file is analyzed again only
+    when its content changed or one of its dependencies was re-analyzed.
+    """
+
+    def __init__(self, simulator='ghdl', workdir=DEFAULT_WORKDIR, std='93c', run_args=(),
+                 timeout=None, fail_pattern=DEFAULT_FAIL_PATTERN):
+        self.simulator = shlex.split(simulator) if isinstance(simulator, str) else list(simulator)
+        self.workdir = os.path.abspath(workdir)
+        self.std = std
+        self.run_args = list(run_args)
+        self.timeout = timeout
+        self.fail_re = re.compile(fail_pattern, re.IGNORECASE) if fail_pattern else None
+        self.log_dir = os.path.join(self.workdir, 'logs')
+        os.makedirs(self.log_dir, exist_ok=True)
+        # One manifest per simulator command and standard, like the libraries
+        key = hashlib.sha256(json.dumps([self.simulator, std]).encode('utf-8')).hexdigest()[:12]
+        self.manifest_path = os.path.join(self.workdir, f"analyzed-{key}.json")
+        self.analyzed = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        _atomic_write_text(self.manifest_path, json.dumps(self.analyzed, indent=1, sort_keys=True))
+
+    def _options(self):
+        return [f"--workdir={self.workdir}", f"--std={self.std}"]
+
+    def _log_path(self, name):
+        return os.path.join(self.log_dir, f"{name}.log")
+
+    def analyze(self, paths, testbenches=()):
+        """Analyze the files that changed, in dependency order.
+
+        Returns (analyzed count, {path: log path} of failed files). Files
+        depending on a failed file are not analyzed and count as failed.
+        """
+        ordered, dependencies = analysis_order(paths, testbenches)
+        redone = set()
+        failed = {}
+        for path in ordered:
+            key = os.path.abspath(path)
+            with open(path, 'rb') as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            blocked = [d for d in dependencies[path] if d in failed]
+            if blocked:
+                failed[path] = failed[blocked[0]]
+                continue
+            if self.analyzed.get(key) == digest and not dependencies[path] & redone:
+                continue
+
+            log_path = self._log_path(os.path.basename(path))
+            with open(log_path, 'w') as log:
+                code = subprocess.call(self.simulator + ['-a'] + self._options() + [key],
+                                       stdout=log, stderr=subprocess.STDOUT)
+            if code != 0:
+                self.analyzed.pop(key, None)
+                failed[path] = log_path
+            else:
+                self.analyzed[key] = digest
+                redone.add(path)
+        self._save_manifest()
+        return len(redone), failed
+
+    def run_unit(self, unit, path):
+        """Elaborate and run one testbench unit and return its RunResult."""
+        log_path = self._log_path(unit)
+        command = self.simulator + ['--elab-run'] + self._options() + [unit] + self.run_args
+        start = time.perf_counter()
+        with open(log_path, 'w') as log:
+            try:
+                code = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT,
+                                       cwd=os.path.dirname(os.path.abspath(path)),
+                                       timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                code = None
+            except OSError as e:
+                log.write(f"cannot start simulator: {e}\n")
+                return RunResult(unit, path, False, 'error', time.perf_counter() - start, log_path)
+        wall = time.perf_counter() - start
+
+        if code is None:
+            return RunResult(unit, path, False, 'timeout', wall, log_path)
+        passed = code == 0
+        if passed and self.fail_re is not None:
+            with open(log_path, 'r', errors='replace') as log:
+                passed = not any(self.fail_re.search(line) for line in log)
+        return RunResult(unit, path, passed, 'pass' if passed else 'fail', wall, log_path)
+
+    def run(self, units, jobs=None):
+        """Run (unit, path) pairs in parallel, yielding each RunResult as it finishes."""
+        # Every run is a simulator process, so threads are enough to use all cores
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            futures = [executor.submit(self.run_unit, unit, path) for unit, path in units]
+            for future in as_completed(futures):
+                yield future.result()
+
+def testbench_units(paths):
+    """Return (unit, path) pairs for the entities of testbench files."""
+    units = []
+    for path in paths:
+        for entity in iter_vhdl_entities(read_chunks(path)):
+            units.append((entity.name, path))
+    return units
+
+def discover_testbenches(sources):
+    """Return the generated testbench files that exist for the entities of sources."""
+    found = []
+    for path in sources:
+        try:
+            names = [entity.name for entity in iter_vhdl_entities(read_chunks(path))]
+        except (OSError, UnicodeDecodeError):
+            continue
+        for name in names:
+            tb_path = testbench_path_for(path, name)
+            if os.path.exists(tb_path):
+                found.append(os.path.normpath(tb_path))
+    return found
+
+def index_main(argv):
+    """Entry point of the 'index' subcommand."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} index",
+        description="Build or refresh the persistent entity and package index of a project."
+    )
+    parser.add_argument('inputs', nargs='+',
+                        help="VHDL files, directories (scanned recursively) or glob patterns")
+    parser.add_argument('--db', default=DEFAULT_INDEX, metavar='FILE',
+                        help=f"index database (default: {DEFAULT_INDEX})")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--keep-missing', action='store_true',
+                        help="keep indexed files that are not among the inputs")
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    files, unmatched = collect_vhdl_files(args.inputs)
+    for item in unmatched:
+        print(f"Error: no VHDL files matched '{item}'")
+    index = ProjectIndex(args.db)
+    try:
+        counts = index.update(files, jobs=args.jobs, prune=not args.keep_missing)
+    finally:
+        index.close()
+    print(f"Index {args.db}: {counts['added']} added, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, {counts['removed']} removed, "
+          f"{counts['failed']} failed")
+    sys.exit(1 if unmatched or counts['failed'] else 0)
+
+def query_main(argv):
+    """Entry point of the 'query' subcommand."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} query",
+        description="Look up entities, packages and constants in the project index."
+    )
+    parser.add_argument('--db', default=DEFAULT_INDEX, metavar='FILE',
+                        help=f"index database (default: {DEFAULT_INDEX})")
+    what = parser.add_mutually_exclusive_group(required=True)
+    what.add_argument('--entity', metavar='NAME', help="files that define entity NAME")
+    what.add_argument('--port-type', metavar='TYPE', help="entities with a port of type TYPE")
+    what.add_argument('--package', metavar='NAME', help="files that declare package NAME")
+    what.add_argument('--constant', metavar='[PACKAGE.]NAME', help="package constants called NAME")
+    parser.add_argument('--generate', action='store_true',
+                        help="with --entity or --port-type, regenerate the matching testbenches")
+    parser.add_argument('--timestamp', default='now', metavar='VALUE',
+                        help="header timestamp for --generate (see the main command)")
+    parser.add_argument('--resolve', action='store_true',
+                        help="with --generate, resolve signal widths against the indexed packages")
+    args = parser.parse_args(argv)
+    if args.generate and not (args.entity or args.port_type):
+        parser.error("--generate needs --entity or --port-type")
+    if not os.path.exists(args.db):
+        parser.error(f"index '{args.db}' does not exist; build it with the 'index' subcommand")
+
+    index = ProjectIndex(args.db)
+    try:
+        if args.package:
+            matches = index.find_package(args.package)
+            for path in matches:
+                print(f"{args.package}\t{path}")
+        elif args.constant:
+            package, _, name = args.constant.rpartition('.')
+            matches = index.find_constant(name, package or None)
+            for package_name, constant, path in matches:
+                value = '' if constant.value is None else f" := {constant.value}"
+                print(f"{package_name}.{constant.name} : {constant.type}{value}\t{path}")
+        else:
+            def lookup():
+                if args.entity:
+                    return index.find_entity(args.entity)
+                return index.entities_with_port_type(args.port_type)
+
+            matches = lookup()
+            if args.generate:
+                # Refresh only the files involved, then generate from the index
+                stale = index.stale_paths(sorted({path for path, _ in matches}))
+                if stale:
+                    index.update(stale, prune=False)
+                    matches = lookup()
+                options = {'timestamp': None if args.timestamp.lower() == 'none'
+                           else args.timestamp}
+                if args.resolve:
+                    options['resolver'] = ConstantResolver(index_path=args.db)
+                if not generate_from_index(matches, options):
+                    sys.exit(1)
+            else:
+                for path, entity in matches:
+                    print(f"{entity.name}\t{path}")
+    finally:
+        index.close()
+    sys.exit(0 if matches else 1)
+
+def run_main(argv):
+    """Entry point of the 'run' subcommand."""
+    parser = argparse.ArgumentParser(
+        prog=f"{os.path.basename(sys.argv[0])} run",
+        description="Analyze sources and run their generated testbenches in parallel.",
+        epilog="The simulator is called as 'SIM -a --workdir=DIR --std=STD FILE' and "
+               "'SIM --elab-run --workdir=DIR --std=STD UNIT [ARGS]', as GHDL expects."
+    )
+    parser.add_argument('inputs', nargs='*',
+                        help="VHDL files, directories (scanned recursively) or glob patterns; "
+                             "the generated testbenches of their entities are run, as are "
+                             "testbench files given explicitly")
+    parser.add_argument('--manifest', action='append', default=[], metavar='FILE',
+                        help="also run the testbenches listed in a sweep manifest (repeatable)")
+    parser.add_argument('--simulator', default='ghdl', metavar='COMMAND',
+                        help="simulator command, split like a shell would (default: ghdl)")
+    parser.add_argument('--workdir', default=DEFAULT_WORKDIR, metavar='DIR',
+                        help=f"shared work library directory (default: {DEFAULT_WORKDIR})")
+    parser.add_argument('--std', default='93c', help="VHDL standard passed to the simulator (default: 93c)")
+    parser.add_argument('--run-arg', action='append', default=[], metavar='ARG',
+                        help="extra argument for every run, e.g. --run-arg=--stop-time=1ms (repeatable)")
+    parser.add_argument('--timeout', type=float, default=None, metavar='SECONDS',
+                        help="wall-clock limit per testbench")
+    parser.add_argument('--fail-pattern', default=DEFAULT_FAIL_PATTERN, metavar='REGEX',
+                        help="simulator output that fails a run with exit status 0 "
+                             "(default: error and failure reports; '' disables)")
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help="number of parallel runs (default: number of CPUs)")
+    parser.add_argument('--json', metavar='FILE', default=None,
+                        help="write the per-testbench results as JSON")
+    args = parser.parse_args(argv)
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if not args.inputs and not args.manifest:
+        parser.error("give inputs or --manifest")
+
+    explicit = [os.path.normpath(item) for item in args.inputs
+                if os.path.isfile(item) and is_testbench_file(item)]
+    manifest_sources = []
+    for manifest_path in args.manifest:
+        try:
+            with open(manifest_path, 'r') as file:
+                runs = json.load(file)['runs']
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"cannot read sweep manifest {manifest_path}: {e}")
+        explicit.extend(os.path.normpath(run['testbench']) for run in runs)
+        manifest_sources.extend(os.path.normpath(run['source']) for run in runs)
+    sources, unmatched = collect_vhdl_files([item for item in args.inputs
+                                            if os.path.normpath(item) not in explicit])
+    sources = sorted(set(sources) | set(manifest_sources))
+    sources = [path for path in sources if not is_testbench_file(path)]
+    for item in unmatched:
+        print(f"Error: no VHDL files matched '{item}'")
+    testbenches = sorted(set(explicit) | set(discover_testbenches(sources)))
+    if not testbenches:
+        print("No testbenches to run")
+        sys.exit(1)
+
+    runner = SimulationRunner(args.simulator, args.workdir, args.std, args.run_arg,
+                              args.timeout, args.fail_pattern)
+    start = time.perf_counter()
+    analyzed, failed = runner.analyze(sources + testbenches, testbenches)
+    print(f"Analyzed {analyzed} of {len(sources) + len(testbenches)} files "
+          f"in {time.perf_counter() - start:.2f} s")
+    for path, log_path in failed.items():
+        print(f"Error: analysis of {path} failed, see {log_path}")
+
+    results = []
+    units = []
+    for unit, path in testbench_units(testbenches):
+        if path in failed:
+            results.append(RunResult(unit, path, False, 'error', 0.0, failed[path]))
+        else:
+            units.append((unit, path))
+    for result in runner.run(units, args.jobs):
+        results.append(result)
+        line = f"{result.status.upper():<7} {result.unit} ({result.wall_s:.2f} s)"
+        print(line if result.passed else f"{line}, see {result.log_path}")
+
+    passed = sum(1 for result in results if result.passed)
+    print(f"\n{passed} passed, {len(results) - passed} failed")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump([result._asdict() for result in results], file, indent=2)
+    sys.exit(0 if passed == len(results) and not unmatched and not failed else 1)
+
+# Subcommands selected by the first argument; anything else is an input
+SUBCOMMANDS = {'index': index_main, 'query': query_main, 'run': run_main}
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <input_vhdl_file>")
+    argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS and not os.path.exists(argv[0]):
+        SUBCOMMANDS[argv[0]](argv[1:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description="Generate VHDL testbenches for files, directories or glob patterns.",
+        epilog="Subcommands: 'index' builds a persistent entity and package index, "
+               "'query' looks entities up in it, 'run' simulates the generated "
+               "testbenches. Run '<subcommand> --help' for details."
+    )
+    parser.add_argument(
+        'inputs', nargs='+',
+        help="VHDL files, directories (scanned recursively) or glob patterns"
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=None,
+        help="number of worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        '--cache', metavar='FILE', default=None,
+        help="incremental build cache; unchanged interfaces are not regenerated"
+    )
+    parser.add_argument(
+        '--cache-size', type=int, default=DEFAULT_CACHE_ENTRIES, metavar='N',
+        help=f"maximum number of source files kept in the cache (default: {DEFAULT_CACHE_ENTRIES})"
+    )
+    parser.add_argument(
+        '--timestamp', default='now', metavar='VALUE',
+        help="header timestamp: 'now' (default, honours SOURCE_DATE_EPOCH), "
+             "'none' for reproducible output, or a fixed text to pin"
+    )
+    parser.add_argument(
+        '--resolve', action='store_true',
+        help="give testbench signals literal widths, evaluating range bounds from "
+             "generic defaults and package constants"
+    )
+    parser.add_argument(
+        '--packages', action='append', default=[], metavar='PATH',
+        help="with --resolve, also read packages from these files, directories or "
+             "glob patterns (repeatable; the inputs are always searched)"
+    )
+    parser.add_argument(
+        '--index', metavar='FILE', default=None,
+        help="with --resolve, look packages up in this project index instead of "
+             "scanning sources (see the 'index' subcommand)"
+    )
+    parser.add_argument(
+        '--stimulus', choices=('random', 'exhaustive', 'constrained'), default=None,
+        help="write a stimulus vector file per entity (<entity>_tb.vec, needs NumPy) "
+             "and make the testbench stream it through std.textio"
+    )
+    parser.add_argument(
+        '--vectors', type=int, default=1000, metavar='N',
+        help="number of random or constrained vectors (default: 1000)"
+    )
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help="random seed for stimulus vectors (default: 0)"
+    )
+    parser.add_argument(
+        '--constraint', action='append', default=[], metavar='PORT=LOW:HIGH',
+        help="with --stimulus constrained, draw PORT from LOW..HIGH (or PORT=VALUE; repeatable)"
+    )
+    parser.add_argument(
+        '--vector-format', choices=('hex', 'bin'), default='hex',
+        help="vector file digits: hex (read with hread) or bin (default: hex)"
+    )
+    parser.add_argument(
+        '--golden-model', action='append', default=[], metavar='FILE',
+        help="with --stimulus, load golden models from this Python file (repeatable) "
+             "and make testbenches check the outputs of the entities they cover"
+    )
+    parser.add_argument(
+        '--vhdl-std', choices=('93', '2008'), default='93',
+        help="testbench language revision; 2008 ends simulations with std.env.finish "
+             "(default: 93, which stops the clock so the simulation runs out of events)"
+    )
+    parser.add_argument(
+        '--watchdog', default=DEFAULT_WATCHDOG, metavar='TIME',
+        help=f"simulated time after which an unfinished testbench fails, e.g. '500 us', "
+             f"or 'none' (default: {DEFAULT_WATCHDOG})"
+    )
+    parser.add_argument(
+        '--instantiation', choices=('component', 'entity'), default='component',
+        help="instantiate the DUT through a component declaration (default) or directly "
+             "as entity work.<name>, which gives smaller testbenches that analyze faster"
+    )
+    parser.add_argument(
+        '--bundle-ports', action='store_true',
+        help="gather the testbench port signals into records (dut_in, dut_out, dut_inout)"
+    )
+    parser.add_argument(
+        '--sweep', action='append', default=[], metavar='GENERIC=VALUES',
+        help="write one testbench per combination of generic values instead of one per "
+             "entity; VALUES is a comma list of values and LOW:HIGH[:STEP] ranges (repeatable)"
+    )
+    parser.add_argument(
+        '--sweep-manifest', default=DEFAULT_SWEEP_MANIFEST, metavar='FILE',
+        help=f"with --sweep, JSON list of the generated runs (default: {DEFAULT_SWEEP_MANIFEST})"
+    )
+    parser.add_argument(
+        '--stdout', action='store_true',
+        help="write the testbenches to standard output instead of files"
+    )
+    parser.add_argument(
+        '--first-entity', action='store_true',
+        help="only handle the first entity of each file and stop reading "
+             "the file once its header is parsed (fast on large netlists)"
+    )
+    parser.add_argument(
+        '--stats-json', metavar='FILE', default=None,
+        help="write per-file read/parse/render/write timings as JSON lines ('-' for "
+             "stdout, which moves progress output to stderr)"
+    )
+    parser.add_argument(
+        '--stats-summary', action='store_true',
+        help="print p50/p95/max phase timings and the slowest files at the end"
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help="keep running and regenerate testbenches when sources change; without "
+             f"--cache the build cache is kept in {DEFAULT_WATCH_CACHE} next to the first input"
+    )
+    parser.add_argument(
+        '--poll', type=float, default=None, metavar='SECONDS',
+        help="with --watch, poll file stats at this interval instead of using inotify"
+    )
+    parser.add_argument(
+        '--debounce', type=float, default=0.3, metavar='SECONDS',
+        help="with --watch, wait for this much quiet time before regenerating (default: 0.3)"
+    )
+    args = parser.parse_args()
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.cache_size < 1:
+        parser.error("--cache-size must be at least 1")
+    stimulus = None
+    if args.stimulus:
+        if numpy is None:
+            parser.error("--stimulus needs NumPy, which is not installed")
+        if args.stdout:
+            parser.error("--stimulus writes vector files and cannot be used with --stdout")
+        if args.vectors < 1:
+            parser.error("--vectors must be at least 1")
+        constraints = []
+        for text in args.constraint:
+            try:
+                name, _, bounds = text.partition('=')
+                low, _, high = bounds.partition(':')
+                constraints.append((name.strip(), int(low, 0), int(high or low, 0)))
+            except ValueError:
+                parser.error(f"invalid --constraint '{text}', expected PORT=LOW:HIGH")
+        if args.stimulus == 'constrained' and not constraints:
+            parser.error("--stimulus constrained needs at least one --constraint")
+        if args.stimulus != 'constrained' and constraints:
+            parser.error("--constraint is only used with --stimulus constrained")
+        stimulus = StimulusSpec(args.stimulus, args.vectors, args.seed, tuple(constraints),
+                                args.vector_format)
+    if args.golden_model:
+        if stimulus is None:
+            parser.error("--golden-model needs --stimulus")
+        for path in args.golden_model:
+            try:
+                load_golden_models(path)
+            except Exception as e:
+                parser.error(f"cannot load golden models from {path}: {e}")
+
+    cache = BuildCache(args.cache, args.cache_size) if args.cache else None
+    if args.watch and cache is None:
+        # A persistent cache keeps start-up incremental across sessions
+        cache = BuildCache(default_watch_cache(args.inputs), args.cache_size)
+    options = {'timestamp': None if args.timestamp.lower() == 'none' else args.timestamp,
+               'vhdl_std': args.vhdl_std, 'watchdog': parse_watchdog(args.watchdog, parser),
+               'instantiation': args.instantiation, 'bundle': args.bundle_ports}
+    max_entities = 1 if args.first_entity else None
+
+    def make_resolver():
+        # Packages are gathered once here and shared with every worker
+        if args.index is not None:
+            resolver = ConstantResolver(index_path=args.index)
+        else:
+            package_files, _ = collect_vhdl_files(args.inputs + args.packages)
+            resolver = ConstantResolver(collect_packages(package_files))
+        resolver.preload()
+        return resolver
+
+    if args.resolve:
+        options['resolver'] = make_resolver()
+    if stimulus is not None:
+        options['stimulus'] = stimulus
+    if args.golden_model:
+        options['golden'] = tuple(os.path.abspath(path) for path in args.golden_model)
+    if cache is not None:
+        cache.options_key = options_key(options)
+
+    if args.sweep:
+        if args.stdout or args.watch:
+            parser.error("--sweep cannot be used with --stdout or --watch")
+        sweeps = {}
+        for text in args.sweep:
+            try:
+                name, values = parse_sweep(text)
+            except ValueError as e:
+                parser.error(str(e))
+            sweeps.setdefault(name.lower(), []).extend(values)
+        input_files, unmatched = collect_vhdl_files(args.inputs)
+        for item in unmatched:
+            print(f"Error: no VHDL files matched '{item}'")
+        ok = process_sweep(input_files, sweeps, jobs=args.jobs, options=options,
+                           manifest_path=args.sweep_manifest)
+        sys.exit(0 if ok and not unmatched else 1)
+
+    if args.stdout:
+        input_files, unmatched = collect_vhdl_files(args.inputs)
+        failed = bool(unmatched)
+        for item in unmatched:
+            print(f"Error: no VHDL files matched '{item}'", file=sys.stderr)
+        for path in input_files:
+            try:
+                emit_file(path, sys.stdout, options, max_entities)
+            except NoEntityError:
+                print(f"No entity declaration, skipped: {path}", file=sys.stderr)
+            except Exception as e:
+                print(f"Error generating testbench for '{path}': {e}", file=sys.stderr)
+                failed = True
+        sys.exit(1 if failed else 0)
+
+    collect_stats = bool(args.stats_json or args.stats_summary)
+    stats_stream = None
+    if args.stats_json == '-':
+        # The JSON lines own stdout, so progress and summaries go to stderr
+        stats_stream = sys.stdout
+        sys.stdout = sys.stderr
+    elif args.stats_json:
+        stats_stream = open(args.stats_json, 'w')
+
+    try:
+        # A single plain file keeps the original one-line behaviour
+        if len(args.inputs) == 1 and os.path.isfile(args.inputs[0]) and not args.watch:
+            stats = FileStats(args.inputs[0]) if collect_stats else None
+            ok = process_file(args.inputs[0], cache, options, max_entities, stats)
+            if cache is not None:
+                cache.save()
+            if stats_stream is not None:
+                write_stats_line(stats_stream, stats)
+            if args.stats_summary:
+                print_stats_summary([stats])
+            sys.exit(0 if ok else 1)
+
+        input_files, unmatched = collect_vhdl_files(args.inputs)
+        results = process_batch(input_files, jobs=args.jobs, cache=cache,
+                                options=options, max_entities=max_entities,
+                                collect_stats=collect_stats, stats_stream=stats_stream)
+    finally:
+        if stats_stream is not None and args.stats_json != '-':
+            stats_stream.close()
+
+    if cache is not None:
+        cache.save()
+    print_summary(results, unmatched)
+    if args.stats_summary:
+        print_stats_summary([r.stats for r in results])
+
+    if args.watch:
+        watch(args.inputs, cache, options=options, max_entities=max_entities,
+              jobs=args.jobs, debounce=args.debounce, poll_interval=args.poll,
+              resolver_factory=make_resolver if args.resolve else None)
+        return
+
+    if unmatched or not all(r.ok for r in results):
         sys.exit(1)
-    
-    input_file = sys.argv[1]
-    process_file(input_file)
 
 if __name__ == "__main__":
     main()
@@ -2,9 +2,568 @@ import tkinter as tk
 from tkinter import ttk, filedialog, scrolledtext, font
 import os
 import re
-from datetime import datetime
+import queue
+import threading
+import time
+import difflib
+import itertools
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 import tkinter.font as tkfont
 
+import vhdl_testbench_generator as tbgen
+VHDLTestbenchGenerator = tbgen.VHDLTestbenchGenerator
+
+# VHDL keywords highlighted in the editors
+VHDL_KEYWORDS = (
+    "architecture", "begin", "case", "component", "downto", "else", "elsif", 
+    "end", "entity", "exit", "for", "function", "generate", "generic", "if", 
+    "in", "inout", "is", "library", "loop", "map", "next", "not", "null", 
+    "of", "out", "package", "port", "process", "range", "record", "return", 
+    "signal", "then", "to", "type", "use", "variable", "wait", "when", "while",
+    "std_logic", "std_logic_vector", "unsigned", "signed"
+)
+
+# Tags applied by the highlighter, in pattern order
+HIGHLIGHT_TAGS = ("comment", "string", "keyword", "number", "operator")
+
+# All highlighting rules combined into one pattern so every line is scanned
+# once. Earlier alternatives win, so keywords inside comments and strings
+# are not tagged. Identifiers are matched whole and looked up in a set,
+# which is much cheaper than a 45-way keyword alternation.
+_HIGHLIGHT_RE = re.compile(
+    r'(?P<comment>--.*)'
+    r'|(?P<string>"[^"]*")'
+    r'|(?P<word>[A-Za-z_]\w*)'
+    r'|(?P<number>\b\d+\b)'
+    r'|(?P<operator>[<=>:&|+\-/*]+)'
+)
+_KEYWORD_SET = frozenset(VHDL_KEYWORDS)
+
+# Maximum number of index pairs passed to a single Tk tag_add call
+_TAG_BATCH = 5000
+
+def highlight_ranges(text, first_line=1):
+    """Tokenize text and return {tag: [start, end, start, end, ...]}.
+
+    Indices are Tk "line.column" strings, counted from first_line. This
+    does no Tk calls, so it can run on a worker thread.
+    """
+    ranges = {tag: [] for tag in HIGHLIGHT_TAGS}
+    finditer = _HIGHLIGHT_RE.finditer
+    for lineno, line in enumerate(text.split('\n'), first_line):
+        for m in finditer(line):
+            tag = m.lastgroup
+            if tag == 'word':
+                if m.group().lower() not in _KEYWORD_SET:
+                    continue
+                tag = 'keyword'
+            indices = ranges[tag]
+            indices.append(f"{lineno}.{m.start()}")
+            indices.append(f"{lineno}.{m.end()}")
+    return ranges
+
+# Idle time after the last edit before a live preview is regenerated
+PREVIEW_DELAY_MS = 500
+
+class JobCancelled(Exception):
+    """Raised inside a background job that a newer request superseded."""
+
+class BackgroundWorker:
+    """Run slow GUI work on a worker thread and hand results back to Tk.
+
+    Jobs belong to a channel. Submitting a job cancels the previous job of
+    the same channel: a queued job is skipped, and a running job sees its
+    check() raise JobCancelled at the next phase boundary. Results are put
+    on a queue that the Tk main loop drains with root.after, so callbacks
+    always run on the main thread, and results of superseded jobs are
+    dropped. on_busy(bool) is called whenever the worker starts or stops
+    having outstanding jobs.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, on_busy=None):
+        self.root = root
+        self.on_busy = on_busy
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.latest = {}
+        self.outstanding = 0
+        self._ids = itertools.count(1)
+        self._thread = threading.Thread(target=self._run, name="tbgen-worker", daemon=True)
+        self._thread.start()
+        self.root.after(self.POLL_MS, self._poll)
+
+    def submit(self, channel, work, on_done, on_error=None):
+        """Queue work(check) for the worker thread.
+
+        work receives a check() callable to call between phases. on_done
+        gets the return value and on_error the exception, both on the Tk
+        main thread.
+        """
+        job_id = next(self._ids)
+        self.latest[channel] = job_id
+
+        def check():
+            if self.latest.get(channel) != job_id:
+                raise JobCancelled()
+
+        self.outstanding += 1
+        if self.outstanding == 1 and self.on_busy is not None:
+            self.on_busy(True)
+        self.jobs.put((channel, job_id, work, check, on_done, on_error))
+        return job_id
+
+    def cancel(self, channel):
+        """Cancel the current job of a channel, if any."""
+        self.latest[channel] = None
+
+    def _run(self):
+        while True:
+            channel, job_id, work, check, on_done, on_error = self.jobs.get()
+            try:
+                check()
+                outcome = (on_done, work(check))
+            except JobCancelled:
+                outcome = None
+            except Exception as e:
+                outcome = (on_error, e)
+            self.results.put((channel, job_id, outcome))
+
+    def _poll(self):
+        try:
+            while True:
+                channel, job_id, outcome = self.results.get_nowait()
+                self.outstanding -= 1
+                if self.outstanding == 0 and self.on_busy is not None:
+                    self.on_busy(False)
+                if outcome is None or self.latest.get(channel) != job_id:
+                    continue
+                callback, value = outcome
+                if callback is not None:
+                    callback(value)
+        except queue.Empty:
+            pass
+        self.root.after(self.POLL_MS, self._poll)
+
+# Files bigger than this open in the windowed, read-only large-file mode
+LARGE_FILE_BYTES = 8 * 1024 * 1024
+
+# Lines held in the input editor around the viewport in large-file mode
+LARGE_FILE_WINDOW = 2000
+
+# Every LINE_INDEX_STRIDE-th line start is kept in the line-offset index
+LINE_INDEX_STRIDE = 1024
+
+class LargeFileDocument:
+    """Random access to the lines of a file too big for a Tk text widget.
+
+    Only a sparse index of byte offsets (one per LINE_INDEX_STRIDE lines)
+    is kept in memory; a window of lines is read by seeking to the nearest
+    indexed line and skipping forward. Every read opens its own file
+    handle, so the index can be built on a worker thread while the main
+    thread reads windows.
+    """
+
+    def __init__(self, path, stride=LINE_INDEX_STRIDE):
+        self.path = path
+        self.stride = stride
+        self.size = os.path.getsize(path)
+        self.offsets = array('Q', [0])
+        # Unknown until the index is built or a read reaches the end
+        self.line_count = None
+
+    def build_index(self, check=None):
+        """Scan the file once, recording every stride-th line offset."""
+        offsets = array('Q', [0])
+        stride = self.stride
+        lines = 0
+        base = 0
+        last = b''
+        with open(self.path, 'rb') as file:
+            while True:
+                chunk = file.read(1024 * 1024)
+                if not chunk:
+                    break
+                newlines = chunk.count(b'\n')
+                if lines + newlines >= len(offsets) * stride:
+                    pos = -1
+                    seen = lines
+                    while True:
+                        pos = chunk.find(b'\n', pos + 1)
+                        if pos < 0:
+                            break
+                        seen += 1
+                        if seen == len(offsets) * stride:
+                            offsets.append(base + pos + 1)
+                lines += newlines
+                base += len(chunk)
+                last = chunk[-1:]
+                if check is not None:
+                    check()
+        self.offsets = offsets
+        self.line_count = lines + (1 if last not in (b'', b'\n') else 0)
+
+    def read_lines(self, first, count):
+        """Return (text, lines read) for count lines from line first (1-based)."""
+        offsets = self.offsets
+        block = min((first - 1) // self.stride, len(offsets) - 1)
+        skipped = block * self.stride
+        lines = []
+        with open(self.path, 'rb') as file:
+            file.seek(offsets[block])
+            while skipped < first - 1 and file.readline():
+                skipped += 1
+            if skipped == first - 1:
+                for _ in range(count):
+                    line = file.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+        if len(lines) < count and self.line_count is None:
+            # Ran into the end of the file
+            self.line_count = skipped + len(lines)
+        text = b''.join(lines).decode('utf-8', errors='replace')
+        if text.endswith('\n'):
+            text = text[:-1]
+        return text, len(lines)
+
+# Project panel jobs are module-level functions so worker processes can
+# unpickle them
+
+def _scan_project_file(path):
+    """Return (name, ports, generics) for every entity in a file."""
+    return [(entity.name, len(entity.ports), len(entity.generics))
+            for entity in tbgen.iter_vhdl_entities(tbgen.read_chunks(path))]
+
+def _generate_project_entities(path, names, options):
+    """Write the testbenches of the named entities of one file.
+
+    Returns (elapsed seconds, [(entity name, output path or None, result)]).
+    """
+    start = time.perf_counter()
+    generator = VHDLTestbenchGenerator(**options)
+    wanted = set(names)
+    outcomes = []
+    for entity in tbgen.iter_vhdl_entities(tbgen.read_chunks(path)):
+        if entity.name not in wanted:
+            continue
+        wanted.discard(entity.name)
+        output_path = tbgen.testbench_path_for(path, entity.name)
+        with tbgen.AtomicTextWriter(output_path) as out:
+            generator.emit_testbench(entity, out)
+        outcomes.append((entity.name, output_path, "written" if out.written else "up to date"))
+        if not wanted:
+            break
+    for name in sorted(wanted):
+        outcomes.append((name, None, "entity not found"))
+    return time.perf_counter() - start, outcomes
+
+class ProcessJobs:
+    """Run calls in a process pool and report results on the Tk main thread.
+
+    calls is a list of (tag, function, args). Finished futures are picked
+    up by polling with root.after, so the GUI never blocks on a worker;
+    on_result(tag, value, error) is called for each and on_finished(cancelled)
+    once at the end. cancel() drops every call that has not started; calls
+    already running complete in their process but are not reported.
+    """
+
+    POLL_MS = 50
+
+    def __init__(self, root, executor, calls, on_result, on_finished):
+        self.root = root
+        self.on_result = on_result
+        self.on_finished = on_finished
+        self.pending = {}
+        for tag, function, args in calls:
+            self.pending[executor.submit(function, *args)] = tag
+        self._after_id = self.root.after(self.POLL_MS, self._poll)
+
+    def cancel(self):
+        """Stop reporting and cancel the calls that have not started yet."""
+        if self._after_id is None:
+            return
+        self.root.after_cancel(self._after_id)
+        self._after_id = None
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.on_finished(True)
+
+    def _poll(self):
+        for future in [f for f in self.pending if f.done()]:
+            tag = self.pending.pop(future)
+            try:
+                value, error = future.result(), None
+            except Exception as e:
+                value, error = None, e
+            self.on_result(tag, value, error)
+        if self.pending:
+            self._after_id = self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._after_id = None
+            self.on_finished(False)
+
+class ProjectPanel:
+    """Window listing the entities of a folder, for bulk testbench generation.
+
+    Files are scanned and testbenches generated in a process pool, one job
+    per file, so the editor stays responsive. Selecting a file row selects
+    all of its entities; double-clicking an entity opens its file in the
+    editor.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.folder = None
+        self.executor = None
+        self.jobs = None
+        self.file_rows = {}
+        self.entity_rows = {}
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("VHDL Project")
+        self.window.geometry("800x600")
+        self.window.configure(bg="#1E1E1E")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_rowconfigure(1, weight=2)
+        self.window.grid_rowconfigure(3, weight=1)
+
+        style = app.style
+        style.configure("Treeview", background="#1E1E1E", fieldbackground="#1E1E1E",
+                        foreground="#D4D4D4")
+        style.configure("Treeview.Heading", background="#252526", foreground="#D4D4D4")
+
+        # Folder selection
+        top = ttk.Frame(self.window)
+        top.grid(row=0, column=0, sticky="ew", padx=5, pady=5)
+        ttk.Button(top, text="Choose Folder...", command=self.choose_folder).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top, text="Rescan", command=self.scan).pack(side=tk.LEFT, padx=5)
+        self.folder_label = ttk.Label(top, text="No folder selected")
+        self.folder_label.pack(side=tk.LEFT, padx=5)
+
+        # Files and their entities
+        entity_frame = ttk.LabelFrame(self.window, text="Entities")
+        entity_frame.grid(row=1, column=0, sticky="nsew", padx=5, pady=5)
+        entity_frame.grid_columnconfigure(0, weight=1)
+        entity_frame.grid_rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(entity_frame, columns=("ports", "generics", "status"),
+                                 selectmode="extended")
+        self.tree.heading("#0", text="File / Entity")
+        self.tree.heading("ports", text="Ports")
+        self.tree.heading("generics", text="Generics")
+        self.tree.heading("status", text="Status")
+        self.tree.column("#0", width=380)
+        for column in ("ports", "generics"):
+            self.tree.column(column, width=70, anchor=tk.E)
+        self.tree.column("status", width=200)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        tree_scroll = ttk.Scrollbar(entity_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        tree_scroll.grid(row=0, column=1, sticky="ns")
+        self.tree.configure(yscrollcommand=tree_scroll.set)
+        self.tree.bind("<Double-1>", self.on_double_click)
+
+        # Actions and progress
+        actions = ttk.Frame(self.window)
+        actions.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
+        ttk.Button(actions, text="Select All", command=self.select_all).pack(side=tk.LEFT, padx=5)
+        self.generate_button = ttk.Button(actions, text="Generate Selected",
+                                          command=self.generate_selected)
+        self.generate_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = ttk.Button(actions, text="Cancel", command=self.cancel,
+                                        state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.progress = ttk.Progressbar(actions, mode='determinate', length=200)
+        self.progress.pack(side=tk.LEFT, padx=5)
+        self.status = ttk.Label(actions, text="")
+        self.status.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+
+        # Generation results
+        result_frame = ttk.LabelFrame(self.window, text="Results")
+        result_frame.grid(row=3, column=0, sticky="nsew", padx=5, pady=5)
+        result_frame.grid_columnconfigure(0, weight=1)
+        result_frame.grid_rowconfigure(0, weight=1)
+        self.results = ttk.Treeview(result_frame, columns=("testbench", "result", "time"),
+                                    selectmode="browse")
+        self.results.heading("#0", text="Entity")
+        self.results.heading("testbench", text="Testbench")
+        self.results.heading("result", text="Result")
+        self.results.heading("time", text="Time (ms)")
+        self.results.column("#0", width=180)
+        self.results.column("testbench", width=340)
+        self.results.column("result", width=160)
+        self.results.column("time", width=80, anchor=tk.E)
+        self.results.grid(row=0, column=0, sticky="nsew")
+        result_scroll = ttk.Scrollbar(result_frame, orient=tk.VERTICAL, command=self.results.yview)
+        result_scroll.grid(row=0, column=1, sticky="ns")
+        self.results.configure(yscrollcommand=result_scroll.set)
+
+    def pool(self):
+        """Return the panel's process pool, starting it on first use."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor()
+        return self.executor
+
+    def close(self):
+        """Cancel outstanding jobs, stop the pool and close the window."""
+        if self.jobs is not None:
+            self.jobs.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.window.destroy()
+
+    def set_running(self, running):
+        """Enable Cancel and disable Generate while jobs are outstanding."""
+        self.cancel_button.configure(state=tk.NORMAL if running else tk.DISABLED)
+        self.generate_button.configure(state=tk.DISABLED if running else tk.NORMAL)
+
+    def choose_folder(self):
+        """Ask for a project folder and scan it."""
+        folder = filedialog.askdirectory(parent=self.window, mustexist=True)
+        if folder:
+            self.folder = folder
+            self.folder_label.config(text=folder)
+            self.scan()
+
+    def scan(self):
+        """List the VHDL files of the folder, then parse them in the pool."""
+        if self.folder is None:
+            return
+        if self.jobs is not None:
+            self.jobs.cancel()
+        folder = self.folder
+        self.status.config(text="Scanning folder...")
+
+        def work(check):
+            return tbgen.collect_vhdl_files([folder])[0]
+
+        def done(files):
+            if folder != self.folder or not self.window.winfo_exists():
+                return
+            self.tree.delete(*self.tree.get_children())
+            self.file_rows = {}
+            self.entity_rows = {}
+            for path in files:
+                iid = self.tree.insert('', tk.END, text=os.path.relpath(path, folder),
+                                       values=("", "", "scanning..."), open=True)
+                self.file_rows[iid] = path
+            self.start_jobs([(iid, _scan_project_file, (path,))
+                             for iid, path in self.file_rows.items()],
+                            len(files), self.on_scanned, "Scanned")
+
+        def failed(error):
+            self.status.config(text=f"Error scanning folder: {str(error)}")
+
+        self.app.worker.submit('scan', work, done, failed)
+
+    def start_jobs(self, calls, total, on_result, verb):
+        """Run calls in the pool with progress counted up to total."""
+        self.progress.configure(maximum=max(1, total), value=0)
+        self.set_running(True)
+        self.status.config(text=f"{verb} 0 of {total}")
+
+        def result(tag, value, error):
+            on_result(tag, value, error)
+            self.status.config(text=f"{verb} {int(self.progress['value'])} of {total}")
+
+        def finished(cancelled):
+            self.jobs = None
+            self.set_running(False)
+            done = int(self.progress['value'])
+            self.status.config(text=f"{verb} {done} of {total}" + (" (cancelled)" if cancelled else ""))
+
+        if not calls:
+            finished(False)
+            return
+        self.jobs = ProcessJobs(self.app.root, self.pool(), calls, result, finished)
+
+    def on_scanned(self, iid, entities, error):
+        """Fill in the entity rows of a scanned file."""
+        self.progress.step(1)
+        if error is not None:
+            self.tree.set(iid, "status", f"error: {str(error)}")
+            return
+        if not entities:
+            self.tree.delete(iid)
+            del self.file_rows[iid]
+            return
+        self.tree.set(iid, "status", f"{len(entities)} entit{'y' if len(entities) == 1 else 'ies'}")
+        for name, ports, generics in entities:
+            child = self.tree.insert(iid, tk.END, text=name, values=(ports, generics, ""))
+            self.entity_rows[child] = (self.file_rows[iid], name)
+
+    def select_all(self):
+        """Select every file row, and with it every entity."""
+        self.tree.selection_set(list(self.file_rows))
+
+    def selected_entities(self):
+        """Return {path: [entity row ids]} for the selection; file rows count as all entities."""
+        selected = {}
+        for iid in self.tree.selection():
+            if iid in self.file_rows:
+                rows = self.tree.get_children(iid)
+            elif iid in self.entity_rows:
+                rows = (iid,)
+            else:
+                continue
+            for row in rows:
+                path = self.entity_rows[row][0]
+                if row not in selected.setdefault(path, []):
+                    selected[path].append(row)
+        return selected
+
+    def generate_selected(self):
+        """Generate the testbenches of the selected entities, one pool job per file."""
+        selected = self.selected_entities()
+        if not selected:
+            self.status.config(text="No entities selected")
+            return
+        if self.jobs is not None:
+            self.jobs.cancel()
+        self.results.delete(*self.results.get_children())
+        options = {'timestamp': self.app.generator.timestamp}
+        calls = []
+        for path, rows in selected.items():
+            for row in rows:
+                self.tree.set(row, "status", "queued")
+            names = [self.entity_rows[row][1] for row in rows]
+            calls.append((rows, _generate_project_entities, (path, names, options)))
+        total = sum(len(rows) for rows in selected.values())
+        self.start_jobs(calls, total, self.on_generated, "Generated")
+
+    def on_generated(self, rows, value, error):
+        """Record the outcome of one file's generation job."""
+        self.progress.step(len(rows))
+        by_name = {self.entity_rows[row][1]: row for row in rows}
+        if error is not None:
+            outcomes = [(name, None, f"error: {str(error)}") for name in by_name]
+            elapsed = 0.0
+        else:
+            elapsed, outcomes = value
+        for name, output_path, result in outcomes:
+            self.tree.set(by_name[name], "status", result)
+            testbench = os.path.relpath(output_path, self.folder) if output_path else ""
+            self.results.insert('', tk.END, text=name,
+                                values=(testbench, result, f"{elapsed * 1000:.0f}"))
+
+    def cancel(self):
+        """Cancel the running scan or generation."""
+        if self.jobs is not None:
+            self.jobs.cancel()
+        for row in self.entity_rows:
+            if self.tree.set(row, "status") == "queued":
+                self.tree.set(row, "status", "cancelled")
+
+    def on_double_click(self, event):
+        """Open the file of the double-clicked entity in the editor."""
+        iid = self.tree.identify_row(event.y)
+        if iid in self.entity_rows:
+            self.app.load_file(self.entity_rows[iid][0])
+
 class CustomText(tk.Text):
     """Text widget with syntax highlighting and line numbers"""
     def __init__(self, *args, **kwargs):
@@ -19,15 +578,133 @@ class CustomText(tk.Text):
         self.tag_configure("operator", foreground="#D4D4D4")
         
         # VHDL keywords
-        self.keywords = [
-            "architecture", "begin", "case", "component", "downto", "else", "elsif", 
-            "end", "entity", "exit", "for", "function", "generate", "generic", "if", 
-            "in", "inout", "is", "library", "loop", "map", "next", "not", "null", 
-            "of", "out", "package", "port", "process", "range", "record", "return", 
-            "signal", "then", "to", "type", "use", "variable", "wait", "when", "while",
-            "std_logic", "std_logic_vector", "unsigned", "signed"
-        ]
-        
+        self.keywords = list(VHDL_KEYWORDS)
+
+        # Lines touched by edits since the last highlighting pass
+        self._dirty_first = None
+        self._dirty_last = None
+        self._flush_id = None
+        self._reported_line_count = 1
+
+        # Route the widget's Tcl command through _proxy to see every edit,
+        # whether it comes from the keyboard, a paste or the program
+        self._orig_command = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig_command)
+        self.tk.createcommand(self._w, self._proxy)
+
+    def destroy(self):
+        tk.Text.destroy(self)
+        self.tk.deletecommand(self._w)
+
+    def _proxy(self, command, *args):
+        if command not in ("insert", "delete", "replace") or not args:
+            return self.tk.call((self._orig_command, command) + args)
+
+        first = int(str(self.tk.call(self._orig_command, "index", args[0])).split('.')[0])
+        result = self.tk.call((self._orig_command, command) + args)
+        if command == "insert":
+            added = sum(str(chars).count('\n') for chars in args[1::2])
+        elif command == "replace":
+            added = sum(str(chars).count('\n') for chars in args[2::2])
+        else:
+            added = 0
+        self._mark_dirty(first, first + added)
+        return result
+
+    def _mark_dirty(self, first, last):
+        if self._dirty_first is None:
+            self._dirty_first, self._dirty_last = first, last
+        else:
+            self._dirty_first = min(self._dirty_first, first)
+            self._dirty_last = max(self._dirty_last, last)
+        if self._flush_id is None:
+            self._flush_id = self.after_idle(self._flush_changes)
+
+    def _flush_changes(self):
+        """Re-highlight the edited lines and the visible viewport.
+
+        Generates <<Edited>> after incremental edits (but not after set_text)
+        and <<LinesChanged>> when the number of lines differs from the last
+        time, so line-number gutters only update when they need to.
+        """
+        self._flush_id = None
+        line_count = self.line_count()
+        if self._dirty_first is not None:
+            first, last = self._dirty_first, self._dirty_last
+            self._dirty_first = self._dirty_last = None
+            self.highlight_lines(first, min(last, line_count))
+            self.highlight_visible()
+            self.event_generate("<<Edited>>")
+        if line_count != self._reported_line_count:
+            self._reported_line_count = line_count
+            self.event_generate("<<LinesChanged>>")
+
+    def line_count(self):
+        """Return the number of lines in the widget."""
+        return int(self.index("end-1c").split('.')[0])
+
+    def visible_lines(self):
+        """Return the (first, last) line numbers currently on screen."""
+        first = int(self.index("@0,0").split('.')[0])
+        last = int(self.index(f"@0,{self.winfo_height()}").split('.')[0])
+        return first, last
+
+    def apply_highlight_ranges(self, ranges, first_line, last_line):
+        """Replace the highlighting of a line range with precomputed ranges."""
+        start, end = f"{first_line}.0", f"{last_line}.end"
+        for tag in HIGHLIGHT_TAGS:
+            self.tag_remove(tag, start, end)
+        for tag, indices in ranges.items():
+            for i in range(0, len(indices), 2 * _TAG_BATCH):
+                self.tag_add(tag, *indices[i:i + 2 * _TAG_BATCH])
+
+    def highlight_lines(self, first_line, last_line):
+        """Re-highlight the given inclusive line range in one pass."""
+        if last_line < first_line:
+            return
+        text = self.get(f"{first_line}.0", f"{last_line}.end")
+        self.apply_highlight_ranges(highlight_ranges(text, first_line), first_line, last_line)
+
+    def highlight_visible(self):
+        """Re-highlight the lines currently on screen."""
+        self.highlight_lines(*self.visible_lines())
+
+    def set_text(self, text, ranges=None):
+        """Replace the whole content, using precomputed highlight ranges if given."""
+        self.delete('1.0', tk.END)
+        self.insert('1.0', text)
+        if ranges is None:
+            self.highlight_all()
+        else:
+            self._dirty_first = self._dirty_last = None
+            self.apply_highlight_ranges(ranges, 1, self.line_count())
+
+    def patch_text(self, text):
+        """Change the content to text by rewriting only the lines that differ.
+
+        Scroll position and cursor are kept, and because the edits go
+        through the widget's proxy only the touched lines are re-highlighted.
+        """
+        old_lines = self.get('1.0', 'end-1c').splitlines(True)
+        new_lines = text.splitlines(True)
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        top = self.yview()[0]
+        cursor = self.index(tk.INSERT)
+        for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+            if tag == 'equal':
+                continue
+            end = f"{i2 + 1}.0" if i2 < len(old_lines) else 'end-1c'
+            self.delete(f"{i1 + 1}.0", end)
+            if j2 > j1:
+                self.insert(f"{i1 + 1}.0", ''.join(new_lines[j1:j2]))
+        self.mark_set(tk.INSERT, cursor)
+        self.yview_moveto(top)
+
+    def highlight_all(self):
+        """Highlight the whole document and drop any pending edit ranges."""
+        self._dirty_first = self._dirty_last = None
+        self.highlight_lines(1, self.line_count())
+
     def highlight_pattern(self, pattern, tag, start="1.0", end="end", regexp=False):
         """Apply the given tag to all text that matches the given pattern"""
         start = self.index(start)
@@ -45,10 +722,6 @@ class CustomText(tk.Text):
             self.mark_set("matchEnd", "%s+%sc" % (index, count.get()))
             self.tag_add(tag, "matchStart", "matchEnd")
 
-class VHDLTestbenchGenerator:
-    # [Previous VHDLTestbenchGenerator class code remains exactly the same]
-    # ... [Keep all the previous code for this class]
-
 class TestbenchGeneratorGUI:
     def __init__(self, root):
         self.root = root
@@ -89,10 +762,36 @@ class TestbenchGeneratorGUI:
         )
         self.regenerate_button.pack(side=tk.LEFT, padx=5)
         
+        # Create project button
+        self.project_button = ttk.Button(
+            self.button_frame,
+            text="Open Project...",
+            command=self.open_project
+        )
+        self.project_button.pack(side=tk.LEFT, padx=5)
+        self.project_panel = None
+        
         # Create label for selected file
         self.file_label = ttk.Label(self.button_frame, text="No file selected")
         self.file_label.pack(side=tk.LEFT, padx=5)
         
+        # Create save button and live preview toggle
+        self.save_button = ttk.Button(
+            self.button_frame,
+            text="Save Testbench",
+            command=self.save_testbench
+        )
+        self.save_button.pack(side=tk.RIGHT, padx=5)
+        
+        self.live_preview = tk.BooleanVar(value=False)
+        self.live_check = ttk.Checkbutton(
+            self.button_frame,
+            text="Live Preview",
+            variable=self.live_preview,
+            command=self.schedule_preview
+        )
+        self.live_check.pack(side=tk.RIGHT, padx=5)
+        
         # Create frame for text areas
         self.left_frame = ttk.LabelFrame(root, text="Input VHDL File")
         self.left_frame.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
@@ -187,7 +886,10 @@ class TestbenchGeneratorGUI:
             command=self.on_input_scroll
         )
         self.input_vscrollbar.grid(row=0, column=2, sticky="ns")
-        self.input_text.configure(yscrollcommand=self.input_vscrollbar.set)
+        # Keep the gutter aligned however the editor is scrolled
+        self.input_text.configure(
+            yscrollcommand=lambda *args: self.on_text_yscroll(
+                self.input_vscrollbar, self.input_line_numbers, *args))
         
         self.output_vscrollbar = ttk.Scrollbar(
             self.right_frame,
@@ -195,25 +897,52 @@ class TestbenchGeneratorGUI:
             command=self.on_output_scroll
         )
         self.output_vscrollbar.grid(row=0, column=2, sticky="ns")
-        self.output_text.configure(yscrollcommand=self.output_vscrollbar.set)
+        self.output_text.configure(
+            yscrollcommand=lambda *args: self.on_text_yscroll(
+                self.output_vscrollbar, self.output_line_numbers, *args))
         
-        # Create status bar
+        # Create status bar with a busy indicator
+        self.status_frame = ttk.Frame(root)
+        self.status_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
         self.status_bar = ttk.Label(
-            root,
+            self.status_frame,
             text="Ready",
             relief=tk.SUNKEN,
             anchor=tk.W
         )
-        self.status_bar.grid(row=2, column=0, columnspan=2, sticky="ew")
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.progress = ttk.Progressbar(self.status_frame, mode='indeterminate', length=120)
+        
+        # Parsing, generation and file I/O run off the Tk main thread
+        self.worker = BackgroundWorker(root, on_busy=self.set_busy)
         
         # Initialize generator
         self.generator = VHDLTestbenchGenerator()
         
-        # Bind events for line numbers
-        self.input_text.bind('<KeyPress>', lambda e: self.after_ms(10, self.update_line_numbers))
-        self.input_text.bind('<KeyRelease>', lambda e: self.after_ms(10, self.update_line_numbers))
-        self.output_text.bind('<KeyPress>', lambda e: self.after_ms(10, self.update_line_numbers))
-        self.output_text.bind('<KeyRelease>', lambda e: self.after_ms(10, self.update_line_numbers))
+        # Live preview regenerates after the input has been idle for a while
+        self.preview_after_id = None
+        self.output_entity_name = None
+        self.input_text.bind('<<Edited>>', lambda e: self.schedule_preview())
+        
+        # Large-file mode: the input editor holds only a window of the file
+        # starting at window_first, and the entity header is kept parsed
+        self.large_doc = None
+        self.large_entity = None
+        self.window_first = 1
+        self.window_chars_per_line = 80
+        self.window_reload_id = None
+        
+        # Line numbers shown in each gutter, updated only when an editor's
+        # line count changes and only for that editor
+        self.gutters = {
+            self.input_text: self.input_line_numbers,
+            self.output_text: self.output_line_numbers,
+        }
+        self.gutter_counts = {gutter: 0 for gutter in self.gutters.values()}
+        for text_widget, gutter in self.gutters.items():
+            gutter.configure(state=tk.DISABLED)
+            text_widget.bind('<<LinesChanged>>',
+                             lambda e, w=text_widget: self.update_line_numbers(w))
         
         # Initial line numbers
         self.update_line_numbers()
@@ -222,6 +951,9 @@ class TestbenchGeneratorGUI:
         self.root.after(ms, callback)
         
     def on_input_scroll(self, *args):
+        if self.large_doc is not None:
+            self.scroll_large_file(*args)
+            return
         self.input_text.yview(*args)
         self.input_line_numbers.yview(*args)
         
@@ -229,103 +961,400 @@ class TestbenchGeneratorGUI:
         self.output_text.yview(*args)
         self.output_line_numbers.yview(*args)
         
-    def update_line_numbers(self):
-        def update_lines(text_widget, line_widget):
-            line_widget.delete('1.0', tk.END)
-            lines = text_widget.get('1.0', tk.END).count('\n')
-            line_numbers = '\n'.join(str(i).rjust(3) for i in range(1, lines + 1))
-            line_widget.insert('1.0', line_numbers)
-            
-        update_lines(self.input_text, self.input_line_numbers)
-        update_lines(self.output_text, self.output_line_numbers)
-        
-    def apply_syntax_highlighting(self, text_widget):
-        content = text_widget.get("1.0", tk.END)
-        
-        # Remove existing tags
-        for tag in text_widget.tag_names():
-            text_widget.tag_remove(tag, "1.0", tk.END)
-        
-        # Apply syntax highlighting
-        for keyword in text_widget.keywords:
-            text_widget.highlight_pattern(r'\y' + keyword + r'\y', "keyword", regexp=True)
-        
-        # Highlight comments
-        text_widget.highlight_pattern(r'--.*$', "comment", regexp=True)
+    def on_text_yscroll(self, scrollbar, gutter, first, last):
+        gutter.yview_moveto(first)
+        if gutter is self.input_line_numbers and self.large_doc is not None:
+            self.on_large_yscroll(float(first), float(last))
+            return
+        scrollbar.set(first, last)
         
-        # Highlight strings
-        text_widget.highlight_pattern(r'"[^"]*"', "string", regexp=True)
+    def update_line_numbers(self, text_widget=None):
+        """Bring gutters in line with their editors' line counts.
+
+        Only the given editor's gutter is touched (both when None), and only
+        the numbers that appeared or disappeared are inserted or deleted.
+        """
+        widgets = [text_widget] if text_widget is not None else list(self.gutters)
+        for widget in widgets:
+            if widget is self.input_text and self.large_doc is not None:
+                # The window gutter is redrawn by show_large_window
+                continue
+            gutter = self.gutters[widget]
+            old_count = self.gutter_counts[gutter]
+            new_count = widget.line_count()
+            if new_count == old_count:
+                continue
+            gutter.configure(state=tk.NORMAL)
+            if new_count > old_count:
+                numbers = '\n'.join(str(i).rjust(3) for i in range(old_count + 1, new_count + 1))
+                gutter.insert(tk.END, ('\n' if old_count else '') + numbers)
+            else:
+                gutter.delete(f"{new_count}.end", tk.END)
+            gutter.configure(state=tk.DISABLED)
+            self.gutter_counts[gutter] = new_count
+            gutter.yview_moveto(widget.yview()[0])
         
-        # Highlight numbers
-        text_widget.highlight_pattern(r'\b\d+\b', "number", regexp=True)
+    def apply_syntax_highlighting(self, text_widget):
+        """Highlight a whole editor in a single tokenizing pass."""
+        text_widget.highlight_all()
         
-        # Highlight operators
-        text_widget.highlight_pattern(r'[<=>:&|+-/*]+', "operator", regexp=True)
+    def parse_entity(self, content):
+        """Parse the first entity of the content, raising if there is none."""
+        entity = self.generator.parse_vhdl_file(content)
+        if entity is None:
+            raise ValueError("no entity declaration found")
+        return entity
+
+    def set_busy(self, busy):
+        """Show or hide the busy indicator in the status bar."""
+        if busy:
+            self.progress.pack(side=tk.RIGHT, padx=5)
+            self.progress.start(10)
+        else:
+            self.progress.stop()
+            self.progress.pack_forget()
         
+    def build_testbench(self, content, check, source_path=None):
+        """Parse, generate and highlight a testbench; runs on the worker thread.
+
+        Writes the testbench next to source_path when one is given. Returns
+        (entity name, testbench, highlight ranges, output path or None).
+        """
+        entity = self.parse_entity(content)
+        check()
+        return self.build_entity_testbench(entity, check, source_path)
+
+    def build_entity_testbench(self, entity, check, source_path=None):
+        """Generate, highlight and optionally write the testbench of a parsed entity."""
+        testbench = self.generator.generate_testbench(entity)
+        check()
+        ranges = highlight_ranges(testbench)
+        output_path = None
+        if source_path is not None:
+            check()
+            output_path = tbgen.testbench_path_for(source_path, entity.name)
+            tbgen.write_if_changed(output_path, testbench)
+        return entity.name, testbench, ranges, output_path
+
     def regenerate_testbench(self):
         """Regenerate testbench from current input text content"""
-        try:
+        source_path = getattr(self, 'current_file', None)
+        self.status_bar.config(text="Regenerating testbench...")
+
+        if self.large_doc is not None:
+            # The editor only holds a window; use the header parsed on load
+            entity = self.large_entity
+
+            def work(check):
+                if entity is None:
+                    raise ValueError("no entity declaration found")
+                return self.build_entity_testbench(entity, check, source_path)
+        else:
             content = self.input_text.get('1.0', tk.END)
-            self.generator.parse_vhdl_file(content)
-            testbench = self.generator.generate_testbench()
-            
-            self.output_text.delete('1.0', tk.END)
-            self.output_text.insert('1.0', testbench)
-            self.apply_syntax_highlighting(self.output_text)
-            
-            if hasattr(self, 'current_file'):
-                output_path = os.path.splitext(self.current_file)[0] + '_tb.vhd'
-                with open(output_path, 'w') as file:
-                    file.write(testbench)
+
+            def work(check):
+                return self.build_testbench(content, check, source_path)
+
+        def done(result):
+            self.output_entity_name, testbench, ranges, output_path = result
+            self.output_text.set_text(testbench, ranges)
+            if output_path is not None:
                 self.status_bar.config(
                     text=f"Testbench regenerated successfully: {os.path.basename(output_path)}"
                 )
             else:
                 self.status_bar.config(text="Testbench regenerated (not saved - no input file selected)")
-                
-        except Exception as e:
-            self.status_bar.config(text=f"Error regenerating testbench: {str(e)}")
+
+        def failed(error):
+            self.status_bar.config(text=f"Error regenerating testbench: {str(error)}")
+
+        self.worker.submit('generate', work, done, failed)
         
+    def schedule_preview(self):
+        """Restart the idle timer that triggers a live preview."""
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+            self.preview_after_id = None
+        if self.live_preview.get() and self.large_doc is None:
+            self.preview_after_id = self.root.after(PREVIEW_DELAY_MS, self.preview_testbench)
+
+    def preview_testbench(self):
+        """Regenerate in the background and patch the output pane, without saving."""
+        self.preview_after_id = None
+        content = self.input_text.get('1.0', tk.END)
+
+        def work(check):
+            entity = self.parse_entity(content)
+            check()
+            return entity.name, self.generator.generate_testbench(entity)
+
+        def done(result):
+            self.output_entity_name, testbench = result
+            self.output_text.patch_text(testbench)
+            self.status_bar.config(text="Preview updated (not saved)")
+
+        def failed(error):
+            self.status_bar.config(text=f"Preview not updated: {str(error)}")
+
+        self.worker.submit('generate', work, done, failed)
+
+    def save_testbench(self):
+        """Write the testbench shown in the output pane to disk."""
+        testbench = self.output_text.get('1.0', 'end-1c')
+        if not testbench.strip():
+            self.status_bar.config(text="Nothing to save")
+            return
+        source_path = getattr(self, 'current_file', None)
+        if source_path is not None and self.output_entity_name:
+            output_path = tbgen.testbench_path_for(source_path, self.output_entity_name)
+        else:
+            output_path = filedialog.asksaveasfilename(
+                defaultextension=".vhd",
+                initialfile=f"{self.output_entity_name or 'testbench'}_tb.vhd",
+                filetypes=[("VHDL files", "*.vhd *.vhdl"), ("All files", "*.*")]
+            )
+            if not output_path:
+                return
+
+        def work(check):
+            return tbgen.write_if_changed(output_path, testbench)
+
+        def done(written):
+            state = "saved" if written else "already up to date"
+            self.status_bar.config(text=f"Testbench {state}: {os.path.basename(output_path)}")
+
+        def failed(error):
+            self.status_bar.config(text=f"Error saving testbench: {str(error)}")
+
+        self.worker.submit('save', work, done, failed)
+
     def select_file(self):
         """Handle file selection and display content"""
         file_path = filedialog.askopenfilename(
             filetypes=[("VHDL files", "*.vhd *.vhdl"), ("All files", "*.*")]
         )
-        
         if file_path:
+            self.load_file(file_path)
+
+    def load_file(self, file_path):
+        """Show a file in the input editor and generate its testbench."""
+        # Loading a file supersedes any pending regeneration and indexing
+        self.worker.cancel('generate')
+        self.worker.cancel('index')
+        try:
+            size = os.path.getsize(file_path)
+        except OSError as e:
+            self.status_bar.config(text=f"Error: {str(e)}")
+            return
+        if size >= LARGE_FILE_BYTES:
+            self.open_large_file(file_path)
+            return
+
+        self.status_bar.config(text=f"Loading {os.path.basename(file_path)}...")
+
+        def work(check):
+            # Read and highlight the input file
+            with open(file_path, 'r') as file:
+                content = file.read()
+            check()
+            input_ranges = highlight_ranges(content)
+            check()
+
+            # Generate, highlight and write the testbench
             try:
-                self.current_file = file_path
-                # Update file label
-                self.file_label.config(text=os.path.basename(file_path))
-                
-                # Read and display input file
-                with open(file_path, 'r') as file:
-                    content = file.read()
-                self.input_text.delete('1.0', tk.END)
-                self.input_text.insert('1.0', content)
-                self.apply_syntax_highlighting(self.input_text)
-                
-                # Generate and display testbench
-                self.generator.parse_vhdl_file(content)
-                testbench = self.generator.generate_testbench()
-                self.output_text.delete('1.0', tk.END)
-                self.output_text.insert('1.0', testbench)
-                self.apply_syntax_highlighting(self.output_text)
-                
-                # Generate output file
-                output_path = os.path.splitext(file_path)[0] + '_tb.vhd'
-                with open(output_path, 'w') as file:
-                    file.write(testbench)
-                
+                generated = self.build_testbench(content, check, file_path)
+            except JobCancelled:
+                raise
+            except Exception as e:
+                generated = e
+            return content, input_ranges, generated
+
+        def done(result):
+            content, input_ranges, generated = result
+            self.current_file = file_path
+            self.file_label.config(text=os.path.basename(file_path))
+            self.leave_large_mode()
+            self.input_text.set_text(content, input_ranges)
+            self.update_line_numbers(self.input_text)
+            if isinstance(generated, Exception):
+                self.status_bar.config(text=f"Error: {str(generated)}")
+                return
+            self.output_entity_name, testbench, output_ranges, output_path = generated
+            self.output_text.set_text(testbench, output_ranges)
+            self.status_bar.config(
+                text=f"Testbench generated successfully: {os.path.basename(output_path)}"
+            )
+
+        def failed(error):
+            self.status_bar.config(text=f"Error: {str(error)}")
+
+        self.worker.submit('load', work, done, failed)
+
+    def open_project(self):
+        """Show the project panel, creating it on first use."""
+        if self.project_panel is None or not self.project_panel.window.winfo_exists():
+            self.project_panel = ProjectPanel(self)
+        self.project_panel.window.lift()
+        if self.project_panel.folder is None:
+            self.project_panel.choose_folder()
+
+    def open_large_file(self, file_path):
+        """Open a huge file read-only, keeping only a window of it in the editor.
+
+        Only the first entity header is parsed; the tokenizer stops right
+        after it, so the rest of the file is never read for generation. The
+        line-offset index that makes scrolling anywhere cheap is built by a
+        separate job, so the first window and the testbench show up first.
+        """
+        self.status_bar.config(text=f"Loading {os.path.basename(file_path)} in large-file mode...")
+
+        def work(check):
+            entities = list(tbgen.iter_vhdl_entities(tbgen.read_chunks(file_path), max_entities=1))
+            entity = entities[0] if entities else None
+            check()
+            document = LargeFileDocument(file_path)
+            window, _ = document.read_lines(1, LARGE_FILE_WINDOW)
+            input_ranges = highlight_ranges(window)
+            check()
+            generated = None
+            if entity is not None:
+                generated = self.build_entity_testbench(entity, check, file_path)
+            return document, entity, window, input_ranges, generated
+
+        def done(result):
+            document, entity, window, input_ranges, generated = result
+            self.current_file = file_path
+            self.large_doc = document
+            self.large_entity = entity
+            self.file_label.config(text=f"{os.path.basename(file_path)} (large file, read-only)")
+            self.show_large_window(1, window, input_ranges)
+            if generated is None:
+                self.status_bar.config(text="Error: no entity declaration found")
+            else:
+                self.output_entity_name, testbench, output_ranges, output_path = generated
+                self.output_text.set_text(testbench, output_ranges)
                 self.status_bar.config(
                     text=f"Testbench generated successfully: {os.path.basename(output_path)}"
                 )
-                
-                # Update line numbers
-                self.update_line_numbers()
-                
-            except Exception as e:
-                self.status_bar.config(text=f"Error: {str(e)}")
+            self.index_large_file(document)
+
+        def failed(error):
+            self.status_bar.config(text=f"Error: {str(error)}")
+
+        self.worker.submit('load', work, done, failed)
+
+    def index_large_file(self, document):
+        """Build the line-offset index of a large file in the background."""
+        def work(check):
+            document.build_index(check)
+            return document
+
+        def done(document):
+            if document is self.large_doc:
+                self.on_large_yscroll(*map(float, self.input_text.yview()))
+
+        def failed(error):
+            self.status_bar.config(text=f"Error indexing file: {str(error)}")
+
+        self.worker.submit('index', work, done, failed)
+
+    def leave_large_mode(self):
+        """Return the input editor to normal, editable whole-file mode."""
+        if self.large_doc is None:
+            return
+        self.large_doc = None
+        self.large_entity = None
+        self.window_first = 1
+        if self.window_reload_id is not None:
+            self.root.after_cancel(self.window_reload_id)
+            self.window_reload_id = None
+        self.input_text.configure(state=tk.NORMAL)
+        gutter = self.input_line_numbers
+        gutter.configure(state=tk.NORMAL, width=4)
+        gutter.delete('1.0', tk.END)
+        gutter.configure(state=tk.DISABLED)
+        self.gutter_counts[gutter] = 0
+
+    def show_large_window(self, first_line, text=None, ranges=None):
+        """Load the window of the large file that starts at first_line."""
+        document = self.large_doc
+        if text is None:
+            text, count = document.read_lines(first_line, LARGE_FILE_WINDOW)
+            if count == 0 and first_line > 1:
+                # Scrolled past the end before the line count was known
+                first_line = max(1, (document.line_count or 1) - LARGE_FILE_WINDOW + 1)
+                text, count = document.read_lines(first_line, LARGE_FILE_WINDOW)
+        self.window_first = first_line
+        self.window_chars_per_line = max(1, len(text) // max(1, text.count('\n') + 1))
+        self.input_text.configure(state=tk.NORMAL)
+        self.input_text.set_text(text, ranges)
+        self.input_text.configure(state=tk.DISABLED)
+
+        # The gutter shows file line numbers, not window line numbers
+        last_line = first_line + self.input_text.line_count() - 1
+        gutter = self.input_line_numbers
+        gutter.configure(state=tk.NORMAL, width=max(4, len(str(last_line)) + 1))
+        gutter.delete('1.0', tk.END)
+        gutter.insert('1.0', '\n'.join(str(i).rjust(3) for i in range(first_line, last_line + 1)))
+        gutter.configure(state=tk.DISABLED)
+
+    def large_total_lines(self):
+        """Return the file's line count, estimated until it is known."""
+        document = self.large_doc
+        if document.line_count is not None:
+            return document.line_count
+        window_last = self.window_first + self.input_text.line_count() - 1
+        return max(window_last, document.size // self.window_chars_per_line)
+
+    def large_window_stale(self, line, page):
+        """Whether lines line..line+page are missing from, or near the edge of, the window."""
+        window_last = self.window_first + self.input_text.line_count() - 1
+        margin = LARGE_FILE_WINDOW // 4
+        if line < self.window_first or line + page - 1 > window_last:
+            return True
+        at_start = self.window_first == 1
+        at_end = (self.large_doc.line_count is not None
+                  and window_last >= self.large_doc.line_count)
+        return ((line - self.window_first < margin and not at_start)
+                or (window_last - (line + page - 1) < margin and not at_end))
+
+    def goto_large_line(self, line):
+        """Scroll the large file so that line is at the top of the editor."""
+        self.window_reload_id = None
+        first, last = self.input_text.visible_lines()
+        page = last - first + 1
+        line = max(1, min(line, self.large_total_lines() - page + 1))
+        if self.large_window_stale(line, page):
+            start = max(1, line - LARGE_FILE_WINDOW // 2)
+            if self.large_doc.line_count is not None:
+                start = min(start, max(1, self.large_doc.line_count - LARGE_FILE_WINDOW + 1))
+            self.show_large_window(start)
+            line = max(self.window_first, line)
+        self.input_text.yview_moveto((line - self.window_first) / self.input_text.line_count())
+
+    def scroll_large_file(self, *args):
+        """Scrollbar command in large-file mode: positions refer to the whole file."""
+        first, last = self.input_text.visible_lines()
+        top = self.window_first + first - 1
+        if args[0] == 'moveto':
+            self.goto_large_line(int(float(args[1]) * self.large_total_lines()) + 1)
+        elif args[0] == 'scroll':
+            step = last - first if args[2].startswith('page') else 1
+            self.goto_large_line(top + int(args[1]) * max(1, step))
+
+    def on_large_yscroll(self, first, last):
+        """Map the window's scroll position onto the file for the scrollbar.
+
+        Wheel and keyboard scrolling move the editor inside the window, so
+        the window is re-centred shortly before they reach one of its edges.
+        """
+        count = self.input_text.line_count()
+        total = self.large_total_lines()
+        top = self.window_first + int(first * count)
+        bottom = self.window_first + int(last * count)
+        self.input_vscrollbar.set((top - 1) / total, min(1.0, (bottom - 1) / total))
+        if self.window_reload_id is None and self.large_window_stale(top, bottom - top):
+            self.window_reload_id = self.root.after_idle(lambda: self.goto_large_line(top))
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,19 @@
+"""Importable name for vhdl-testbench-generator.py.
+
+The command line script's file name is not a valid module name, so the
+GUI, the benchmark and the tests import it through this module:
+
+    import vhdl_testbench_generator as tbgen
+
+Importing replaces this module in sys.modules by the loaded script, so
+there is a single copy of its globals and its objects pickle by this name.
+"""
+import os
+import sys
+import importlib.util
+
+_spec = importlib.util.spec_from_file_location(
+    __name__, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vhdl-testbench-generator.py'))
+_module = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)